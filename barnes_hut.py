@@ -0,0 +1,311 @@
+import time
+import numpy as np
+from physics import SOFTENING, get_acceleration as direct_acceleration
+
+# Morton keys interleave 21 bits per axis into a 63-bit integer
+MAX_DEPTH = 21
+DEFAULT_THETA = 0.5
+DEFAULT_LEAF_SIZE = 8
+# Groups walked through the tree together; bounds the size of the
+# (group, node) interaction frontier held in memory at once.
+WALK_CHUNK = 4096
+# Consecutive Morton-ordered particles that walk the tree as one group
+DEFAULT_GROUP_SIZE = 32
+# (target, source) pairs evaluated per dense block; small enough to stay in cache
+BLOCK_ELEMENTS = 1 << 16
+
+def _spread_bits(v):
+    """Spreads the low 21 bits of v so that two zero bits sit between each."""
+    v = v & np.uint64(0x1fffff)
+    v = (v | v << np.uint64(32)) & np.uint64(0x1f00000000ffff)
+    v = (v | v << np.uint64(16)) & np.uint64(0x1f0000ff0000ff)
+    v = (v | v << np.uint64(8)) & np.uint64(0x100f00f00f00f00f)
+    v = (v | v << np.uint64(4)) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | v << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return v
+
+def _morton_keys(pos, lo, size):
+    cells = 1 << MAX_DEPTH
+    ijk = np.clip(((pos - lo) * (cells / size)).astype(np.int64), 0, cells - 1).astype(np.uint64)
+    return (_spread_bits(ijk[:, 0]) << np.uint64(2)) | (_spread_bits(ijk[:, 1]) << np.uint64(1)) | _spread_bits(ijk[:, 2])
+
+def _ragged_arange(starts, counts):
+    """Concatenation of arange(s, s + c) for every (s, c) pair."""
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(counts)
+    offsets = np.repeat(starts - (ends - counts), counts)
+    return offsets + np.arange(total)
+
+class Octree:
+    """
+    Array-backed octree built from Morton-sorted particles.
+    Nodes of all levels are stored in flat arrays; the children of an internal
+    node are contiguous, described by child_first and child_count.
+    """
+
+    def __init__(self, pos, masses, leaf_size=DEFAULT_LEAF_SIZE):
+        pos = np.asarray(pos, dtype=np.float64)
+        masses = np.asarray(masses, dtype=np.float64)
+
+        lo = pos.min(axis=0)
+        size = float((pos.max(axis=0) - lo).max())
+        if size == 0: size = 1.0
+        size *= 1 + 1e-9  # keep the far faces inside the root cell
+        self.root_size = size
+
+        keys = _morton_keys(pos, lo, size)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.pos = pos[self.order]
+        self.masses = masses[self.order]
+
+        weighted = self.pos * self.masses[:, np.newaxis]
+        levels = []
+        # Level 0: the root, split further while it holds too many particles
+        starts = np.array([0])
+        counts = np.array([len(masses)])
+        for level in range(MAX_DEPTH + 1):
+            shift = np.uint64(3 * (MAX_DEPTH - level))
+            mass = np.add.reduceat(self.masses, starts)
+            com = np.add.reduceat(weighted, starts, axis=0)
+            com /= np.where(mass > 0, mass, 1.0)[:, np.newaxis]
+            internal = (counts > leaf_size) & (level < MAX_DEPTH)
+            levels.append((starts, counts, self.keys[starts] >> shift, mass, com, internal, level))
+            if not internal.any():
+                break
+
+            # Children of internal nodes: runs of equal key prefix one level down.
+            # Leaves keep their particles as a single run so coverage stays contiguous.
+            child_shift = np.uint64(3 * (MAX_DEPTH - level - 1))
+            prefix = self.keys >> child_shift
+            breaks = np.flatnonzero(prefix[1:] != prefix[:-1]) + 1
+            owner_internal = np.repeat(internal, counts)
+            breaks = breaks[owner_internal[breaks]]
+            starts = np.unique(np.concatenate([starts, breaks]))
+            counts = np.diff(np.append(starts, len(masses)))
+
+        # Flatten levels, keeping only nodes whose parent was internal
+        self._flatten(levels)
+
+    def _flatten(self, levels):
+        start, count, prefix, mass, com, level_of, internal_of, parents = [], [], [], [], [], [], [], []
+        offset = 0
+        prev = None
+        for starts, counts, prefixes, mass_l, com_l, internal, level in levels:
+            if prev is None:
+                keep = np.ones(len(starts), dtype=bool)
+                parent = np.full(len(starts), -1)
+            else:
+                p_starts, p_internal, p_index = prev
+                parent_local = np.searchsorted(p_starts, starts, side='right') - 1
+                keep = p_internal[parent_local]
+                parent = p_index[parent_local[keep]]
+            idx = np.full(len(starts), -1)
+            idx[keep] = offset + np.arange(keep.sum())
+            offset += keep.sum()
+            start.append(starts[keep]); count.append(counts[keep]); prefix.append(prefixes[keep])
+            mass.append(mass_l[keep]); com.append(com_l[keep])
+            level_of.append(np.full(keep.sum(), level)); parents.append(parent)
+            internal_of.append(internal[keep])
+            prev = (starts, internal & keep, idx)
+
+        self.start = np.concatenate(start)
+        self.count = np.concatenate(count)
+        self.prefix = np.concatenate(prefix)
+        self.mass = np.concatenate(mass)
+        self.com = np.concatenate(com)
+        self.level = np.concatenate(level_of)
+        self.is_leaf = ~np.concatenate(internal_of)
+        self.shift = (3 * (MAX_DEPTH - self.level)).astype(np.uint64)
+        self.size_sq = (self.root_size / 2.0 ** self.level) ** 2
+
+        parent = np.concatenate(parents)
+        n_nodes = len(self.start)
+        self.child_count = np.bincount(parent[1:], minlength=n_nodes)
+        self.child_first = np.zeros(n_nodes, dtype=np.int64)
+        # Nodes are emitted level by level in key order, so each parent's
+        # children occupy a contiguous run starting at its first child.
+        first = np.flatnonzero(np.r_[True, parent[2:] != parent[1:-1]]) + 1
+        self.child_first[parent[first]] = first
+
+def get_acceleration(pos, masses, G, theta=DEFAULT_THETA, leaf_size=DEFAULT_LEAF_SIZE, group_size=DEFAULT_GROUP_SIZE):
+    """
+    Barnes-Hut acceleration with opening angle theta.
+    pos: (N, 3) array of positions
+    masses: (N,) array of masses
+    The walk is grouped: runs of group_size consecutive particles in Morton
+    order walk the tree together. A node of side s whose centre of mass lies
+    at distance d from the group's bounding box is used as a point mass when
+    s / d < theta and it holds none of the group's particles; otherwise it is
+    opened, and opened leaves are summed particle by particle. Each group's
+    interaction lists are then evaluated as dense blocks. The tree is rebuilt
+    on every call, so each RK4 stage sees up-to-date positions.
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    masses = np.asarray(masses, dtype=np.float64)
+    num_bodies = len(masses)
+    if num_bodies <= leaf_size:
+        return direct_acceleration(pos, masses, G)
+
+    tree = Octree(pos, masses, leaf_size)
+    theta_sq = theta * theta
+    first = np.arange(0, num_bodies, group_size)
+    last = np.minimum(first + group_size, num_bodies)
+    box_lo = np.minimum.reduceat(tree.pos, first, axis=0)
+    box_hi = np.maximum.reduceat(tree.pos, first, axis=0)
+    node_end = tree.start + tree.count
+
+    far_pairs, near_pairs = [], []
+    for g0 in range(0, len(first), WALK_CHUNK):
+        group = np.arange(g0, min(g0 + WALK_CHUNK, len(first)))
+        node = np.zeros(len(group), dtype=np.int64)
+        while len(group):
+            com = tree.com[node]
+            gap = np.maximum(np.maximum(box_lo[group] - com, com - box_hi[group]), 0.0)
+            r2 = np.einsum('ij,ij->i', gap, gap)
+            overlap = (tree.start[node] < last[group]) & (first[group] < node_end[node])
+            far = (tree.size_sq[node] < theta_sq * r2) & ~overlap
+            leaf = ~far & tree.is_leaf[node]
+            far_pairs.append((group[far], node[far]))
+            near_pairs.append((group[leaf], node[leaf]))
+
+            opened = ~far & ~tree.is_leaf[node]
+            counts = tree.child_count[node[opened]]
+            node = _ragged_arange(tree.child_first[node[opened]], counts)
+            group = np.repeat(group[opened], counts)
+
+    # Accepted nodes act as a point mass at their centre of mass; leaves
+    # that are too close contribute each of their members
+    far_group, far_node = (np.concatenate(a) for a in zip(*far_pairs))
+    near_group, near_node = (np.concatenate(a) for a in zip(*near_pairs))
+    counts = tree.count[near_node]
+    near_group = np.repeat(near_group, counts)
+    members = _ragged_arange(tree.start[near_node], counts)
+
+    acc_sorted = np.zeros((num_bodies, 3))
+    _add_interactions(acc_sorted, tree, first, last, far_group, tree.com[far_node], tree.mass[far_node], G, exact=False)
+    _add_interactions(acc_sorted, tree, first, last, near_group, tree.pos[members], tree.masses[members], G, exact=True)
+
+    acceleration = np.empty_like(acc_sorted)
+    acceleration[tree.order] = acc_sorted
+    return acceleration
+
+def _add_interactions(acc, tree, first, last, group, src_pos, src_mass, G, exact):
+    """
+    Adds the pull of sources (src_pos, src_mass) on every particle of their
+    group. Groups with similar source counts are padded into dense blocks of
+    at most BLOCK_ELEMENTS (target, source) pairs. Far sources (exact=False)
+    get r^2 from a matrix product around the group centre; near ones are
+    differenced directly so close pairs keep full precision.
+    """
+    order = np.argsort(group, kind='stable')
+    group, src_pos, src_mass = group[order], src_pos[order], src_mass[order]
+    num_groups = len(first)
+    counts = np.bincount(group, minlength=num_groups)
+    offsets = np.cumsum(counts) - counts
+    group_size = int((last - first).max())
+
+    by_count = np.argsort(counts, kind='stable')
+    by_count = by_count[counts[by_count] > 0]
+    sorted_counts = counts[by_count]
+    b0 = 0
+    while b0 < len(by_count):
+        # Counts ascend, so the padded block size grows with its last group
+        cost = np.arange(1, len(by_count) - b0 + 1) * group_size * sorted_counts[b0:]
+        b1 = b0 + max(1, int(np.searchsorted(cost, BLOCK_ELEMENTS, side='right')))
+        groups = by_count[b0:b1]
+        width = sorted_counts[b1 - 1]
+
+        col = np.arange(width)
+        valid = col < counts[groups, np.newaxis]
+        index = offsets[groups, np.newaxis] + np.minimum(col, counts[groups, np.newaxis] - 1)
+        slots = np.minimum(first[groups, np.newaxis] + np.arange(group_size), last[groups, np.newaxis] - 1)
+        centre = tree.pos[first[groups]][:, np.newaxis, :]
+        tgt = tree.pos[slots] - centre
+        src = src_pos[index] - centre
+        mass = np.where(valid, src_mass[index], 0.0)[:, np.newaxis, :]
+
+        if exact:
+            # Component-major layout keeps the source axis contiguous
+            src_c = np.ascontiguousarray(src.transpose(2, 0, 1))
+            tgt_c = np.ascontiguousarray(tgt.transpose(2, 0, 1))
+            d = src_c[:, :, np.newaxis, :] - tgt_c[:, :, :, np.newaxis]
+            r2 = d[0] * d[0]
+            r2 += d[1] * d[1]
+            r2 += d[2] * d[2]
+            w = r2 * np.sqrt(r2)
+            w += SOFTENING
+            np.divide(G * mass, w, out=w)
+            block = np.einsum('bgk,cbgk->bgc', w, d)
+        else:
+            r2 = np.matmul(tgt, src.transpose(0, 2, 1))
+            r2 *= -2
+            r2 += np.einsum('...j,...j->...', tgt, tgt)[:, :, np.newaxis]
+            r2 += np.einsum('...j,...j->...', src, src)[:, np.newaxis, :]
+            np.maximum(r2, 0.0, out=r2)
+            w = r2 * np.sqrt(r2)
+            w += SOFTENING
+            np.divide(G * mass, w, out=w)
+            block = np.matmul(w, src) - tgt * w.sum(axis=2)[:, :, np.newaxis]
+
+        # Padding slots repeat the group's last particle; count it once
+        keep = first[groups, np.newaxis] + np.arange(group_size) < last[groups, np.newaxis]
+        acc[slots[keep]] += block[keep]
+        b0 = b1
+
+def get_acceleration_func(theta=DEFAULT_THETA, leaf_size=DEFAULT_LEAF_SIZE, group_size=DEFAULT_GROUP_SIZE):
+    """Returns an acceleration function with the signature of physics.get_acceleration."""
+
+    def accel(pos, masses, G):
+        return get_acceleration(pos, masses, G, theta=theta, leaf_size=leaf_size, group_size=group_size)
+
+    return accel
+
+def accuracy_report(pos, masses, G, thetas=(0.2, 0.3, 0.5, 0.7, 1.0), leaf_size=DEFAULT_LEAF_SIZE):
+    """
+    Compares Barnes-Hut against the direct-sum kernel for several opening angles.
+    Returns a list of dicts with relative error percentiles and timings.
+    """
+    t0 = time.perf_counter()
+    reference = direct_acceleration(pos, masses, G)
+    direct_time = time.perf_counter() - t0
+    ref_norm = np.linalg.norm(reference, axis=1)
+    ref_norm[ref_norm == 0] = 1
+
+    report = []
+    for theta in thetas:
+        t0 = time.perf_counter()
+        approx = get_acceleration(pos, masses, G, theta=theta, leaf_size=leaf_size)
+        bh_time = time.perf_counter() - t0
+        rel_err = np.linalg.norm(approx - reference, axis=1) / ref_norm
+        report.append({
+            "theta": theta,
+            "median_rel_err": float(np.median(rel_err)),
+            "p99_rel_err": float(np.percentile(rel_err, 99)),
+            "max_rel_err": float(rel_err.max()),
+            "bh_seconds": bh_time,
+            "direct_seconds": direct_time,
+        })
+    return report
+
+def _sample_disk(n, seed=0):
+    """Thin disk of light bodies around a heavy primary, in simulator units."""
+    rng = np.random.default_rng(seed)
+    r = rng.uniform(50, 1000, n)
+    phi = rng.uniform(0, 2 * np.pi, n)
+    pos = np.column_stack([r * np.cos(phi), rng.normal(0, 10, n), r * np.sin(phi)])
+    masses = rng.uniform(1e-3, 1.0, n)
+    pos[0] = 0
+    masses[0] = 1e6
+    return pos, masses
+
+if __name__ == "__main__":
+    for n in (2000, 20000):
+        pos, masses = _sample_disk(n)
+        print(f"\nN = {n}")
+        print(f"{'theta':>6} {'median':>10} {'p99':>10} {'max':>10} {'BH s':>8} {'direct s':>9}")
+        for row in accuracy_report(pos, masses, 1.0):
+            print(f"{row['theta']:>6.2f} {row['median_rel_err']:>10.2e} {row['p99_rel_err']:>10.2e} "
+                  f"{row['max_rel_err']:>10.2e} {row['bh_seconds']:>8.3f} {row['direct_seconds']:>9.3f}")
@@ -0,0 +1,358 @@
+"""
+Reproducible benchmarks of the physics, projection, rendering and Horizons
+parsing hot paths, swept over body count, steps per frame and trail length:
+
+    python bench.py run --out baseline.json
+    python bench.py run --quick --baseline baseline.json
+    python bench.py compare baseline.json bench.json
+
+Rendering runs on the SDL dummy video driver and fetches go to a local
+horizons_stub server, so no display or network is needed. compare exits
+with status 1 if any benchmark got slower than the threshold allows.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pygame
+import barnes_hut
+import cache
+import data
+import ephemeris
+import horizons_stub
+import physics
+import ui
+import visualization
+
+# Body counts of the sweep, and the reduced set used by --quick
+SIZES = (2, 10, 100, 1000, 10000, 100000)
+QUICK_SIZES = (2, 10, 100, 1000)
+# Body counts of the RK4 frame benchmarks in both modes; the largest ones
+# sit above physics.DIRECT_MAX_BODIES, so the tiled force path is covered
+STEP_SIZES = (2, 10, 100, 1000, 2048)
+STEPS_PER_FRAME = (1, 10, 100)
+TRAIL_LENGTHS = (50, 350, 1000)
+# Bodies whose trails are drawn in the trail benchmarks
+TRAIL_BODIES = (10, 100)
+# Larger configurations are skipped: direct O(N^2) forces above this many
+# bodies, per-point projection above SCALAR_MAX_POINTS, and RK4 frames whose
+# pair interactions (4 evaluations of N^2 pairs per step) exceed MAX_FRAME_PAIRS
+DIRECT_MAX_BODIES = 10000
+SCALAR_MAX_POINTS = 1000
+MAX_FRAME_PAIRS = 1e8
+
+# Each benchmark is timed REPEATS times, each over at least MIN_TIME / REPEATS seconds
+MIN_TIME = 0.5
+REPEATS = 5
+# A benchmark counts as regressed when it is this much slower than the baseline
+DEFAULT_THRESHOLD = 0.10
+
+def measure(func, min_time=MIN_TIME, repeats=REPEATS):
+    """
+    (best, median) seconds per call of func(). A first call warms up and
+    calibrates how many calls make up each repeat; calls longer than
+    min_time are timed only once.
+    """
+    t0 = time.perf_counter()
+    func()
+    first = time.perf_counter() - t0
+    if first >= min_time:
+        return first, first
+    number = max(1, int(min_time / repeats / max(first, 1e-9)))
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - t0) / number)
+    return min(times), float(np.median(times))
+
+def random_system(n, seed=0):
+    """Disk of n bodies around a heavy primary, in simulator units, with circular velocities for G = 1."""
+    rng = np.random.default_rng(seed)
+    r = rng.uniform(50, 1000, n)
+    phi = rng.uniform(0, 2 * np.pi, n)
+    pos = np.column_stack([r * np.cos(phi), rng.normal(0, 10, n), r * np.sin(phi)])
+    masses = rng.uniform(1e-3, 1.0, n)
+    pos[0] = 0
+    masses[0] = 1e6
+    speed = np.sqrt(masses[0] / r)
+    vel = np.column_stack([-speed * np.sin(phi), np.zeros(n), speed * np.cos(phi)])
+    vel[0] = 0
+    return masses, pos, vel
+
+def orbit_trails(n, length, camera):
+    """Projected (n, length, 2) screen points of n circular trails, oldest first."""
+    radii = np.linspace(100, 900, n)[:, np.newaxis]
+    angle = np.linspace(0, 1.5 * np.pi, length)[np.newaxis, :] + np.arange(n)[:, np.newaxis]
+    points = np.stack([radii * np.cos(angle), np.zeros_like(angle), radii * np.sin(angle)], axis=-1)
+    screen, depth, _ = camera.project(points)
+    return screen, depth
+
+# ---------- Benchmarks ----------
+# Each yields (params, func, work, unit, frame): func is timed, work is the
+# number of units it processes per call, frame marks per-frame workloads
+# whose time is also reported as ms/frame.
+
+def bench_accel(sizes):
+    for n in sizes:
+        if n > DIRECT_MAX_BODIES:
+            continue
+        masses, pos, _ = random_system(n)
+        yield {"n": n}, lambda pos=pos, masses=masses: physics.get_acceleration(pos, masses, 1.0), n * n, "pairs/s", False
+
+def bench_barnes_hut(sizes):
+    # Interactive rates at 1e5 bodies are still not met: the grouped walk
+    # brings one evaluation there to about 2.4 s (from 9 s per particle)
+    for n in sizes:
+        if n < 100:
+            continue
+        masses, pos, _ = random_system(n)
+        yield {"n": n}, lambda pos=pos, masses=masses: barnes_hut.get_acceleration(pos, masses, 1.0), n, "bodies/s", False
+
+def bench_rk4(sizes, steps_per_frame=STEPS_PER_FRAME):
+    for n in sizes:
+        for spf in steps_per_frame:
+            if 4 * n * n * spf > MAX_FRAME_PAIRS:
+                continue
+            masses, pos, vel = random_system(n)
+            state = physics.SimState(masses, pos, vel)
+
+            def frame(state=state, spf=spf):
+                for _ in range(spf):
+                    physics.rk4_step(state, 0.01, 1.0)
+            yield {"n": n, "steps_per_frame": spf}, frame, spf, "steps/s", True
+
+def bench_project(sizes):
+    camera = visualization.Camera(1500, np.pi / 6, np.pi / 4)
+    for n in sizes:
+        _, pos, _ = random_system(n)
+        yield {"n": n}, lambda pos=pos: camera.project(pos, visualization.SCREEN_WIDTH), n, "points/s", False
+
+def bench_project_point(sizes):
+    project = visualization.get_projection_func(1500, np.pi / 6, np.pi / 4)
+    for n in sizes:
+        if n > SCALAR_MAX_POINTS:
+            continue
+        points = random_system(n)[1].tolist()
+
+        def run(points=points):
+            for x, y, z in points:
+                project(x, y, z)
+        yield {"n": n}, run, n, "points/s", False
+
+def bench_trails(lengths=TRAIL_LENGTHS, bodies=TRAIL_BODIES):
+    camera = visualization.Camera(1500, np.pi / 6, np.pi / 4)
+    screen = pygame.display.get_surface()
+    renderer = visualization.TrailRenderer()
+    for n in bodies:
+        colors = [(200, 180, 120)] * n
+        for length in lengths:
+            xy, depth = orbit_trails(n, length, camera)
+            segments = n * (length - 1)
+            # The per-segment reference path takes (x, y, depth) tuples
+            triples = [list(zip(p[:, 0].tolist(), p[:, 1].tolist(), d.tolist())) for p, d in zip(xy, depth)]
+            trail_surface = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+
+            def tapered(triples=triples, colors=colors, trail_surface=trail_surface):
+                trail_surface.fill((0, 0, 0, 0))
+                for points, color in zip(triples, colors):
+                    visualization.draw_tapered_trail(trail_surface, points, color)
+                screen.blit(trail_surface, (0, 0))
+            yield {"renderer": "tapered", "bodies": n, "length": length}, tapered, segments, "segments/s", True
+            yield ({"renderer": "bands", "bodies": n, "length": length},
+                   lambda xy=xy, colors=colors: renderer.draw(screen, xy, colors), segments, "segments/s", True)
+
+def bench_bodies(sizes):
+    camera = visualization.Camera(1500, np.pi / 6, np.pi / 4)
+    screen = pygame.display.get_surface()
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        _, pos, _ = random_system(n)
+        xy, depth, visible = camera.project(pos, 150)
+        radii = rng.uniform(0.5, 6, n)
+        radii[0] = 20
+        colors = rng.integers(60, 256, (n, 3))
+        names = [f"Body {i}" for i in range(n)]
+
+        def frame(xy=xy, depth=depth, visible=visible, radii=radii, colors=colors, names=names):
+            visualization.draw_bodies(screen, xy, depth, visible, radii, colors, names, ui.render_label)
+        yield {"n": n}, frame, n, "bodies/s", True
+
+def bench_fetch(url):
+    """data.fetch_state and fetch_states against the stub, with a cold cache on every call."""
+    directory = tempfile.mkdtemp(prefix="gravity-bench-")
+    saved = data.BASE_URL, data.ephemeris_cache, data.OFFLINE
+    data.BASE_URL, data.ephemeris_cache, data.OFFLINE = url, cache.DiskCache(directory), False
+    try:
+        config = data.SYSTEMS["Solar System"]
+        center = f"'{config['center']}'"
+        ids = [b[0] for b in config["bodies"]]
+
+        def one():
+            data.ephemeris_cache.clear()
+            data.fetch_state(ids[1], center)
+
+        def system():
+            data.ephemeris_cache.clear()
+            data.fetch_states(ids, center)
+        yield {"bodies": 1}, one, 1, "requests/s", False
+        yield {"bodies": len(ids)}, system, len(ids), "requests/s", False
+    finally:
+        data.BASE_URL, data.ephemeris_cache, data.OFFLINE = saved
+        shutil.rmtree(directory, ignore_errors=True)
+
+def bench_parse(records=(10, 1000, 10000)):
+    """ephemeris.parse_series on stub vector tables of one record per minute."""
+    start = datetime.strptime(data.EPOCH, "%Y-%m-%d")
+    for n in records:
+        stop = start + timedelta(minutes=n - 1)
+        text = horizons_stub.vectors_result("399", "500@0", f"{start:%Y-%m-%d %H:%M}", f"{stop:%Y-%m-%d %H:%M}", "1m")
+        yield {"records": n}, lambda text=text: ephemeris.parse_series(text, "399"), n, "records/s", False
+
+CASES = ("accel", "barnes_hut", "rk4", "project", "project_point", "trails", "bodies", "fetch", "parse")
+
+def run_benchmarks(cases=CASES, quick=False, min_time=MIN_TIME, progress=print):
+    """
+    Runs the selected cases and returns a list of result dicts with the
+    case name, its params, best and median seconds per call and the
+    throughput of the best call; frame workloads also get ms_per_frame.
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    pygame.display.init()
+    pygame.font.init()
+    pygame.display.set_mode((visualization.SCREEN_WIDTH, visualization.SCREEN_HEIGHT))
+    ui.init_fonts()
+    server, url = horizons_stub.serve_in_background() if "fetch" in cases else (None, None)
+
+    generators = {
+        "accel": lambda: bench_accel(sizes),
+        "barnes_hut": lambda: bench_barnes_hut(sizes),
+        "rk4": lambda: bench_rk4(STEP_SIZES, STEPS_PER_FRAME[:2] if quick else STEPS_PER_FRAME),
+        "project": lambda: bench_project(sizes),
+        "project_point": lambda: bench_project_point(sizes),
+        "trails": lambda: bench_trails(TRAIL_LENGTHS[:2] if quick else TRAIL_LENGTHS, TRAIL_BODIES),
+        "bodies": lambda: bench_bodies(sizes),
+        "fetch": lambda: bench_fetch(url),
+        "parse": lambda: bench_parse(),
+    }
+    results = []
+    try:
+        for case in cases:
+            if case not in generators:
+                raise ValueError(f"Unknown benchmark: {case}")
+            for params, func, work, unit, frame in generators[case]():
+                best, median = measure(func, min_time)
+                result = {"case": case, "params": params, "seconds": best, "median": median,
+                          "rate": work / best, "unit": unit}
+                if frame:
+                    result["ms_per_frame"] = best * 1000
+                results.append(result)
+                if progress:
+                    progress(format_result(result))
+    finally:
+        if server is not None:
+            server.shutdown()
+        pygame.quit()
+    return results
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def result_key(result):
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['case']}[{params}]"
+
+def format_result(result):
+    text = f"{result_key(result):<48} {result['rate']:>12.4g} {result['unit']:<11}"
+    if "ms_per_frame" in result:
+        text += f" {result['ms_per_frame']:>9.3f} ms/frame"
+    return text
+
+# ---------- Comparison ----------
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Matches benchmarks by case and params and returns (key, ratio, status)
+    rows, ratio being current / baseline best seconds. Status is
+    "regression" above 1 + threshold, "improved" below 1 / (1 + threshold),
+    else "ok"; benchmarks missing from either side are reported as "new"
+    or "missing" with ratio None.
+    """
+    old = {result_key(r): r for r in baseline["results"]}
+    new = {result_key(r): r for r in current["results"]}
+    rows = []
+    for key, result in new.items():
+        if key not in old:
+            rows.append((key, None, "new"))
+            continue
+        ratio = result["seconds"] / old[key]["seconds"]
+        status = ("regression" if ratio > 1 + threshold
+                  else "improved" if ratio < 1 / (1 + threshold) else "ok")
+        rows.append((key, ratio, status))
+    rows.extend((key, None, "missing") for key in old if key not in new)
+    return rows
+
+def print_comparison(rows):
+    for key, ratio, status in rows:
+        change = f"{(ratio - 1) * 100:+7.1f}%" if ratio is not None else " " * 8
+        flag = {"regression": "  <-- REGRESSION", "improved": "  faster"}.get(status, "")
+        print(f"{key:<48} {change}{flag if ratio is not None else '  ' + status}")
+    regressions = sum(status == "regression" for _, _, status in rows)
+    print(f"{regressions} regression(s) in {sum(ratio is not None for _, ratio, _ in rows)} matched benchmarks")
+    return regressions
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulator's hot paths.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmarks and save the results as JSON")
+    run.add_argument("--cases", nargs="+", default=list(CASES), choices=CASES)
+    run.add_argument("--quick", action="store_true", help="smaller sweep, up to 1000 bodies")
+    run.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds spent timing each benchmark")
+    run.add_argument("--out", default="bench.json")
+    run.add_argument("--baseline", default=None, help="results file to compare against afterwards")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    cmp = sub.add_parser("compare", help="flag regressions of a results file against a baseline")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                     help="relative slowdown counted as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        current = {"environment": environment(), "results": run_benchmarks(args.cases, args.quick, args.min_time)}
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Wrote {len(current['results'])} results to {args.out}")
+        if not args.baseline:
+            return 0
+        baseline = load_results(args.baseline)
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+    return 1 if print_comparison(compare(baseline, current, args.threshold)) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import numpy as np
+
+# Cache location; GRAVITY_CACHE_DIR overrides it
+DEFAULT_DIR = os.environ.get("GRAVITY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "gravity"))
+# Entries older than this many seconds are treated as missing
+DEFAULT_TTL = 30 * 86400
+# Least recently used entries are evicted once the cache grows past this
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+class DiskCache:
+    """
+    On-disk cache of dicts of NumPy arrays plus JSON-serializable metadata,
+    one .npz file per key. Writes go to a temporary file that is renamed
+    into place, so readers never see a partial entry. Hits refresh the
+    file's mtime, which orders eviction once the total size passes
+    max_bytes; entries older than ttl seconds are dropped on lookup.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, namespace, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.directory, f"{namespace}-{digest}.npz")
+
+    def get(self, namespace, key, expire=True):
+        """
+        (arrays, meta) stored under key, or None if missing, expired or
+        unreadable. Pass expire=False when the entry cannot be refetched
+        (offline) to get it back however old it is, keeping the file.
+        """
+        path = self.path(namespace, key)
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                arrays = {name: f[name] for name in f.files if name != "__meta__"}
+                meta = json.loads(str(f["__meta__"]))
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        if expire and self.ttl is not None and time.time() - meta.get("created", 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return arrays, meta.get("meta", {})
+
+    def put(self, namespace, key, arrays, meta=None):
+        """Stores a dict of arrays and optional metadata atomically under key."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(namespace, key)
+        record = json.dumps({"key": key, "created": time.time(), "meta": meta or {}}, default=str)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, __meta__=np.array(record), **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file as 0600; give it the usual umask-based mode
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0o666 & ~umask)
+            os.replace(tmp, path)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        """(path, size, mtime) of every entry, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(".npz") or name.startswith(".tmp-"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        return sorted(entries, key=lambda e: e[2])
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self, namespace=None):
+        for path, _, _ in self.entries():
+            if namespace is None or os.path.basename(path).startswith(namespace + "-"):
+                self._remove(path)
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "directory": self.directory,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
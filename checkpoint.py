@@ -0,0 +1,159 @@
+import json
+import os
+import struct
+import tempfile
+import numpy as np
+import cache
+import physics
+from physics import SimState
+from simulation import Simulation
+from trails import TrailBuffer
+
+# File layout: preamble (magic, header length, data offset), a JSON header
+# describing every array, then the raw arrays, each aligned to ALIGN bytes
+MAGIC = b"GRVCKP01"
+_PREAMBLE = struct.Struct("<8sIIQ")  # magic, header length, reserved, data offset
+ALIGN = 64
+
+# Per-preset checkpoints used by the viewer to resume systems
+PRESET_DIR = os.path.join(cache.DEFAULT_DIR, "checkpoints")
+
+def preset_path(system, directory=PRESET_DIR):
+    return os.path.join(directory, system.replace(" ", "_") + ".ckpt")
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+def _integrator_state(sim):
+    """Arrays and scalars needed to continue sim's integrator bit for bit."""
+    arrays, meta = {}, {}
+    state = sim.state
+
+    # Acceleration left over by the last symplectic step, if still valid
+    acc_cache = state.acc_cache
+    if acc_cache is not None:
+        c_revision, c_G, c_key, (c_acc, c_test_acc) = acc_cache
+        kind = ("wisdom_holman" if c_key == ("wisdom_holman", sim.accel)
+                else "kdk" if c_key is sim.accel else None)
+        if kind and c_G == sim.G and c_revision == state.revision:
+            arrays["acc_cache"], arrays["acc_cache_test"] = c_acc, c_test_acc
+            meta["acc_cache"] = kind
+
+    # Adaptive step size, counters and the FSAL stage of Dormand-Prince
+    step = sim.step_func
+    if isinstance(step, physics.DormandPrince):
+        meta["dopri"] = {"h": step.h, "n_evals": step.n_evals, "n_accepted": step.n_accepted,
+                         "n_rejected": step.n_rejected}
+        if step._fsal is not None:
+            f_pos, f_vel, f_masses, f_G, f_acc = step._fsal
+            arrays.update(fsal_pos=f_pos, fsal_vel=f_vel, fsal_masses=f_masses, fsal_acc=f_acc)
+            meta["dopri"]["fsal_G"] = f_G
+    return arrays, meta
+
+def save_checkpoint(sim, path):
+    """
+    Writes the complete state of a Simulation to path: body and test-particle
+    arrays, trail buffers, G, dt, time, step and force-evaluation counts,
+    integrator name and its internals (cached accelerations, adaptive step,
+    FSAL stage). The file is written to a temporary name and renamed into
+    place.
+    """
+    state = sim.state
+    trail_arrays, trail_meta = state.trails.get_state()
+    arrays = {
+        "masses": state.masses, "pos": state.pos, "vel": state.vel,
+        "test_pos": state.test_pos, "test_vel": state.test_vel,
+        "trail_data": trail_arrays["data"], "trail_lengths": trail_arrays["lengths"],
+    }
+    extra_arrays, integrator_meta = _integrator_state(sim)
+    arrays.update(extra_arrays)
+
+    table, offset = {}, 0
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        arrays[name] = a
+        table[name] = [a.dtype.str, list(a.shape), offset]
+        offset = _align(offset + a.nbytes)
+
+    header = json.dumps({
+        "system": sim.system,
+        "names": state.names,
+        "colors": state.colors,
+        "G": sim.G, "dt": sim.dt, "t": sim.t, "steps": sim.steps, "force_evals": sim.force_evals,
+        "integrator": sim.integrator,
+        "time_unit": sim.time_unit, "length_scale": sim.length_scale,
+        "trails": trail_meta,
+        "integrator_state": integrator_meta,
+        "arrays": table,
+    }).encode()
+    data_offset = _align(_PREAMBLE.size + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".ckpt")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, len(header), 0, data_offset))
+            f.write(header)
+            for name, a in arrays.items():
+                f.seek(data_offset + table[name][2])
+                f.write(a.data)
+            f.truncate(data_offset + offset)
+        # mkstemp creates the file as 0600; give it the usual umask-based mode
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+def load_checkpoint(path, accel=physics.get_acceleration):
+    """
+    Restores a Simulation saved by save_checkpoint. Arrays are copy-on-write
+    views into a memory map of the file, so nothing is parsed or copied up
+    front, and changes made by the resumed simulation never reach the file.
+    """
+    with open(path, "rb") as f:
+        magic, header_len, _, data_offset = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"Not a checkpoint file: {path}")
+        header = json.loads(f.read(header_len))
+
+    mm = np.memmap(path, dtype=np.uint8, mode="c")
+    arrays = {
+        name: np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=mm, offset=data_offset + offset)
+        for name, (dtype, shape, offset) in header["arrays"].items()
+    }
+
+    state = SimState(arrays["masses"], arrays["pos"], arrays["vel"], header["names"],
+                     [tuple(c) for c in header["colors"]])
+    state.test_pos, state.test_vel = arrays["test_pos"], arrays["test_vel"]
+    state.trails = TrailBuffer.from_state({"data": arrays["trail_data"], "lengths": arrays["trail_lengths"]},
+                                          header["trails"])
+
+    sim = Simulation(state, header["G"], header["dt"], header["integrator"], header["time_unit"],
+                     header["length_scale"], accel, header["system"])
+    sim.t, sim.steps = header["t"], header["steps"]
+    sim.force_evals = header.get("force_evals", 0)
+
+    internals = header["integrator_state"]
+    if "acc_cache" in internals:
+        key = ("wisdom_holman", accel) if internals["acc_cache"] == "wisdom_holman" else accel
+        acc = arrays["acc_cache"]
+        if "acc_cache_test" in arrays:
+            acc = (acc, arrays["acc_cache_test"])
+        else:
+            # Older files stored the test-particle rows after the bodies' rows
+            split = len(acc) - state.n_test
+            acc = (acc[:split], acc[split:])
+        state.acc_cache = (state.revision, sim.G, key, acc)
+    if "dopri" in internals:
+        d, step = internals["dopri"], sim.step_func
+        step.h, step.n_evals, step.n_accepted, step.n_rejected = d["h"], d["n_evals"], d["n_accepted"], d["n_rejected"]
+        if "fsal_acc" in arrays:
+            step._fsal = (arrays["fsal_pos"], arrays["fsal_vel"], arrays["fsal_masses"], d["fsal_G"], arrays["fsal_acc"])
+    return sim
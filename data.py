@@ -1,9 +1,52 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
-import re
+from cache import DiskCache
+from physics import SimState
+
+# JPL Horizons API endpoint (correct URL); HORIZONS_URL overrides it, e.g. to
+# point at a local horizons_stub server
+BASE_URL = os.environ.get("HORIZONS_URL", "https://ssd.jpl.nasa.gov/api/horizons.api")
+
+# --- HTTP settings ---
+# Concurrent requests per system load (and pooled connections per host);
+# enough for the largest preset to load in a single round of requests
+MAX_WORKERS = 16
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (5, 30)
+# Retries on connection errors and 429/5xx replies, with exponential backoff
+# of BACKOFF_FACTOR * 2**attempt seconds
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+
+# Epoch of the vectors fetched for every preset
+EPOCH = "2026-02-01"
+EPOCH_STOP = "2026-02-02"
+OUT_UNITS = "KM-S"
+
+# --- Ephemeris cache ---
+# Fetched vectors and fully scaled presets are cached on disk (see cache.py).
+# In offline mode (set_offline(True) or GRAVITY_OFFLINE=1) a cache miss
+# raises OfflineError instead of touching the network, and entries past the
+# TTL are still served since they cannot be refetched.
+ephemeris_cache = DiskCache()
+OFFLINE = os.environ.get("GRAVITY_OFFLINE", "") not in ("", "0")
 
-# JPL Horizons API endpoint (correct URL)
-BASE_URL = "https://ssd.jpl.nasa.gov/api/horizons.api"
+class OfflineError(RuntimeError):
+    """Raised when offline mode needs data that is not in the cache; what names the missing item."""
+
+    def __init__(self, what):
+        super().__init__(f"{what} is not cached in {ephemeris_cache.directory}; "
+                         f"run once without --offline / GRAVITY_OFFLINE to fetch it")
+
+def set_offline(offline=True):
+    global OFFLINE
+    OFFLINE = offline
 
 # System Configurations
 SYSTEMS = {
@@ -119,21 +162,73 @@ SYSTEMS = {
     }
 }
 
-def fetch_state(body_id, center="'500@0'"):
+AU_KM = 1.495978707e8
+
+# Test-particle populations that can be seeded around each system's primary.
+# (generator, options) pairs for particles.seed_populations; distances in km,
+# angles in radians.
+POPULATIONS = {
+    "Solar System": [
+        ("belt", {"a": (2.1 * AU_KM, 3.3 * AU_KM), "e": (0.0, 0.2), "inc": (0.0, 0.3)}),
+        ("trojans", {"planet": "Jupiter", "weight": 0.2}),
+    ],
+    "Extended Solar System": [
+        ("belt", {"a": (2.1 * AU_KM, 3.3 * AU_KM), "e": (0.0, 0.2), "inc": (0.0, 0.3)}),
+        ("trojans", {"planet": "Jupiter", "weight": 0.2}),
+        ("belt", {"a": (39 * AU_KM, 48 * AU_KM), "e": (0.0, 0.2), "inc": (0.0, 0.5)}),
+    ],
+    "Saturnian System": [
+        ("ring", {"r_in": 74500, "r_out": 136775, "thickness": 10}),
+    ],
+    "Uranian System": [
+        ("ring", {"r_in": 41837, "r_out": 51149, "thickness": 10}),
+    ],
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Shared requests.Session with a pooled, retrying adapter, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            )
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=retry)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def fetch_state(body_id, center="'500@0'", session=None):
+    key = {"url": BASE_URL, "body": body_id, "center": center, "epoch": EPOCH, "units": OUT_UNITS}
+    cached = ephemeris_cache.get("vectors", key, expire=not OFFLINE)
+    if cached is not None:
+        arrays, _ = cached
+        return arrays["pos"], arrays["vel"]
+    if OFFLINE:
+        raise OfflineError(f"Body {body_id} (center {center})")
+
     params = {
         "format": "json",
         "COMMAND": f"'{body_id}'",
         "EPHEM_TYPE": "VECTORS",
         "CENTER": center,
-        "START_TIME": "2026-02-01",
-        "STOP_TIME": "2026-02-02",
+        "START_TIME": EPOCH,
+        "STOP_TIME": EPOCH_STOP,
         "STEP_SIZE": "1d",
-        "OUT_UNITS": "KM-S",
+        "OUT_UNITS": OUT_UNITS,
         "VEC_TABLE": "2",
         "VEC_LABELS": "NO"
     }
 
-    r = requests.get(BASE_URL, params=params)
+    session = session or get_session()
+    r = session.get(BASE_URL, params=params, timeout=REQUEST_TIMEOUT)
     r.raise_for_status()
     data = r.json()
 
@@ -148,13 +243,50 @@ def fetch_state(body_id, center="'500@0'"):
     x, y, z = float(numbers[0]), float(numbers[1]), float(numbers[2])
     vx, vy, vz = float(numbers[3]), float(numbers[4]), float(numbers[5])
     
-    return np.array([x, y, z]), np.array([vx, vy, vz])
+    pos, vel = np.array([x, y, z]), np.array([vx, vy, vz])
+    ephemeris_cache.put("vectors", key, {"pos": pos, "vel": vel})
+    return pos, vel
 
-def get_system_data(system_name="Solar System"):
+def fetch_states(body_ids, center="'500@0'", max_workers=MAX_WORKERS):
+    """
+    Fetches several bodies concurrently over the shared session.
+    Returns a list of (pos, vel) in the order of body_ids; the first
+    failure is re-raised once all requests have finished.
+    """
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(body_ids)))) as pool:
+        futures = [pool.submit(fetch_state, body_id, center, session) for body_id in body_ids]
+    return [f.result() for f in futures]
+
+def get_system_data(system_name="Solar System", use_cache=True):
     """Fetch orbital data for a specific system and return formatted state vectors."""
     if system_name not in SYSTEMS:
         raise ValueError(f"Unknown system: {system_name}")
-    
+    config = SYSTEMS[system_name]
+    if config.get("static") or not use_cache:
+        return _build_system(system_name)
+
+    # The scaled preset is cached as a whole; editing its configuration,
+    # the epoch or the endpoint gives a new key
+    key = {"system": system_name, "config": config, "url": BASE_URL, "epoch": EPOCH}
+    cached = ephemeris_cache.get("preset", key, expire=not OFFLINE)
+    if cached is not None:
+        arrays, meta = cached
+        print(f"Loaded {system_name} from cache")
+        state = SimState(arrays["masses"], arrays["pos"], arrays["vel"], meta["names"], [tuple(c) for c in meta["colors"]])
+        return {"state": state, "G": meta["G"], "length_scale": meta["length_scale"], "time_unit": meta["time_unit"]}
+
+    package = _build_system(system_name)
+    state = package["state"]
+    ephemeris_cache.put(
+        "preset", key,
+        {"masses": state.masses, "pos": state.pos, "vel": state.vel},
+        {"names": state.names, "colors": state.colors,
+         **{k: package[k] for k in ("G", "length_scale", "time_unit")}},
+    )
+    return package
+
+def _build_system(system_name):
     config = SYSTEMS[system_name]
     
     positions = []
@@ -176,8 +308,8 @@ def get_system_data(system_name="Solar System"):
     else:
         print(f"Fetching data for {system_name}...")
         center_id = f"'{config['center']}'"
-        for body_id, mass, name, color in config["bodies"]:
-            pos, vel = fetch_state(body_id, center=center_id)
+        states = fetch_states([b[0] for b in config["bodies"]], center=center_id)
+        for (body_id, mass, name, color), (pos, vel) in zip(config["bodies"], states):
             positions.append(pos)
             velocities.append(vel)
             masses.append(mass)
@@ -208,19 +340,11 @@ def get_system_data(system_name="Solar System"):
     s_m = 1000000 / max_mass
     sim_G = G_real * (s_x / s_m)
 
-    system_data = []
-    for i in range(len(masses)):
-        system_data.append([
-            float(scaled_masses[i]),
-            [float(scaled_positions[i][0]), float(velocities[i][0])],
-            [float(scaled_positions[i][1]), float(velocities[i][1])],
-            [float(scaled_positions[i][2]), float(velocities[i][2])],
-            [],  # Empty trail
-            names[i],
-            colors[i]
-        ])
-
-    return {"state": system_data, "G": sim_G}
+    state = SimState(scaled_masses, scaled_positions, velocities, names, colors)
+
+    # Velocities stay in km/s while lengths are scaled by s_x, so one
+    # simulated time unit lasts 1 / s_x seconds
+    return {"state": state, "G": sim_G, "length_scale": s_x, "time_unit": 1 / s_x}
 
 if __name__ == "__main__":
     from pprint import pprint
@@ -0,0 +1,183 @@
+import numpy as np
+import physics
+from physics import SOFTENING, SimState
+
+# Largest number of (member, body, body) pairs evaluated in one block
+BATCH_PAIRS = physics.TILE_PAIRS
+
+def get_acceleration_batched(pos, masses, G):
+    """
+    Direct-sum accelerations for a whole ensemble at once.
+    pos: (K, N, 3) array, one system per member
+    masses: (N,) shared masses or (K, N) per-member masses
+    Members are processed in chunks of at most BATCH_PAIRS pairs.
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    masses = np.broadcast_to(np.asarray(masses, dtype=np.float64), pos.shape[:2])
+    members, num_bodies = pos.shape[:2]
+    acceleration = np.empty_like(pos)
+
+    chunk = max(1, BATCH_PAIRS // max(1, num_bodies * num_bodies))
+    for k0 in range(0, members, chunk):
+        p = pos[k0:k0 + chunk]
+        diff = p[:, np.newaxis, :, :] - p[:, :, np.newaxis, :]
+        dist_sq = np.einsum('kijd,kijd->kij', diff, diff)
+        inv_r3 = 1.0 / (dist_sq * np.sqrt(dist_sq) + SOFTENING)
+        weights = inv_r3 * masses[k0:k0 + chunk, np.newaxis, :]
+        acceleration[k0:k0 + chunk] = G * np.einsum('kij,kijd->kid', weights, diff)
+    return acceleration
+
+class Ensemble:
+    """
+    K copies of one system integrated together.
+    pos, vel: (K, N, 3) arrays; masses: (N,) shared or (K, N) per member
+    names, colors: metadata shared by every member
+    """
+
+    def __init__(self, masses, pos, vel, names=None, colors=None):
+        self.pos = np.ascontiguousarray(pos, dtype=np.float64)
+        self.vel = np.ascontiguousarray(vel, dtype=np.float64)
+        self.masses = np.asarray(masses, dtype=np.float64)
+        n = self.pos.shape[1]
+        self.names = list(names) if names is not None else [str(i) for i in range(n)]
+        self.colors = list(colors) if colors is not None else [(255, 255, 255)] * n
+        self.t = 0.0
+        # (pos, masses, G, accel, acc) from the last leapfrog step, whose
+        # closing kick force is the next step's opening kick force
+        self.acc_cache = None
+
+    def __len__(self):
+        return len(self.pos)
+
+    def member(self, k):
+        """Detached SimState copy of member k."""
+        masses = self.masses[k] if self.masses.ndim == 2 else self.masses
+        return SimState(masses.copy(), self.pos[k].copy(), self.vel[k].copy(), self.names, self.colors)
+
+    def _cached_acceleration(self, G, accel):
+        """Acceleration from the previous leapfrog step if nothing changed since, else None."""
+        if self.acc_cache is None:
+            return None
+        c_pos, c_masses, c_G, c_accel, c_acc = self.acc_cache
+        if (c_G == G and c_accel is accel and np.array_equal(c_pos, self.pos)
+                and np.array_equal(c_masses, self.masses)):
+            return c_acc
+        return None
+
+    def step(self, dt, G, method="rk4", accel=get_acceleration_batched):
+        """
+        Advances every member by one rk4 or leapfrog step of dt. Consecutive
+        leapfrog steps cost one force evaluation each.
+        """
+        if method == "rk4":
+            self.pos, self.vel = physics.rk4_arrays(self.pos, self.vel, self.masses, dt, G, accel)
+        elif method == "leapfrog":
+            acc = self._cached_acceleration(G, accel)
+            if acc is None:
+                acc = accel(self.pos, self.masses, G)
+            self.vel = self.vel + (dt / 2) * acc
+            self.pos = self.pos + dt * self.vel
+            acc = accel(self.pos, self.masses, G)
+            self.vel = self.vel + (dt / 2) * acc
+            self.acc_cache = (self.pos.copy(), self.masses.copy(), G, accel, acc)
+        else:
+            raise ValueError(f"Unknown ensemble integrator: {method}")
+        self.t += dt
+        return self
+
+def make_clones(state, k, pos_sigma=1e-6, vel_sigma=1e-6, mass_sigma=0.0, seed=None):
+    """
+    Ensemble of k perturbed copies of a SimState, e.g. to sample the
+    uncertainty of Horizons vectors. Member 0 is the unperturbed reference.
+    Each sigma is relative: positions and velocities get Gaussian noise with
+    standard deviation sigma times the body's own |pos| / |vel|, masses are
+    scaled by (1 + sigma * N(0, 1)) and become per-member when mass_sigma > 0.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(state)
+    pos = np.repeat(state.pos[np.newaxis], k, axis=0)
+    vel = np.repeat(state.vel[np.newaxis], k, axis=0)
+    pos_scale = np.linalg.norm(state.pos, axis=1)[:, np.newaxis]
+    vel_scale = np.linalg.norm(state.vel, axis=1)[:, np.newaxis]
+    pos[1:] += rng.normal(0.0, pos_sigma, (k - 1, n, 3)) * pos_scale
+    vel[1:] += rng.normal(0.0, vel_sigma, (k - 1, n, 3)) * vel_scale
+
+    masses = state.masses.copy()
+    if mass_sigma > 0:
+        masses = np.repeat(masses[np.newaxis], k, axis=0)
+        masses[1:] *= 1 + rng.normal(0.0, mass_sigma, (k - 1, n))
+    return Ensemble(masses, pos, vel, state.names, state.colors)
+
+def divergence(ensemble, reference=0):
+    """
+    Phase-space distance of every member from the reference member.
+    Position and velocity differences are made dimensionless with the
+    reference's RMS position and velocity. Returns a (K,) array.
+    """
+    ref_pos, ref_vel = ensemble.pos[reference], ensemble.vel[reference]
+    length = np.sqrt(np.mean(np.sum(ref_pos ** 2, axis=1))) or 1.0
+    speed = np.sqrt(np.mean(np.sum(ref_vel ** 2, axis=1))) or 1.0
+    d_pos = np.sum((ensemble.pos - ref_pos) ** 2, axis=(1, 2)) / length ** 2
+    d_vel = np.sum((ensemble.vel - ref_vel) ** 2, axis=(1, 2)) / speed ** 2
+    return np.sqrt(d_pos + d_vel)
+
+def integrate_ensemble(ensemble, dt, n_steps, G, sample_every=1, method="rk4"):
+    """
+    Runs n_steps steps and records divergence() every sample_every steps.
+    Returns (times, distances) with distances shaped (n_samples, K).
+    """
+    sample_every = max(1, int(sample_every))
+    n_samples = n_steps // sample_every
+    times = np.empty(n_samples)
+    distances = np.empty((n_samples, len(ensemble)))
+    for i in range(1, n_steps + 1):
+        ensemble.step(dt, G, method)
+        if i % sample_every == 0:
+            times[i // sample_every - 1] = ensemble.t
+            distances[i // sample_every - 1] = divergence(ensemble)
+    return times, distances
+
+def lyapunov_summary(times, distances):
+    """
+    Lyapunov-style growth of the separation between members and the
+    reference: a least-squares fit of log(distance) against time per
+    member. Returns per-member rates and their median, spread and the
+    corresponding e-folding time.
+    """
+    members = distances[:, 1:]
+    valid = np.all(members > 0, axis=0)
+    log_d = np.log(members[:, valid])
+    t = times - times.mean()
+    rates = (t @ (log_d - log_d.mean(axis=0))) / (t @ t)
+    median = float(np.median(rates)) if len(rates) else 0.0
+    return {
+        "rates": rates,
+        "median_rate": median,
+        "rate_iqr": float(np.subtract(*np.percentile(rates, [75, 25]))) if len(rates) else 0.0,
+        "e_folding_time": 1 / median if median > 0 else np.inf,
+        "final_median_distance": float(np.median(members[-1])),
+    }
+
+if __name__ == "__main__":
+    import time
+    import data
+
+    package = data.get_system_data("TRAPPIST-1")
+    state, G = package["state"], package["G"]
+    k, steps = 200, 500
+
+    t0 = time.perf_counter()
+    clones = make_clones(state, k, seed=0)
+    times, distances = integrate_ensemble(clones, 0.01, steps, G, sample_every=10)
+    batched = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    single = state.copy()
+    for _ in range(steps):
+        physics.rk4_step(single, 0.01, G)
+    one_run = time.perf_counter() - t0
+
+    summary = lyapunov_summary(times, distances)
+    print(f"{k} clones: {batched:.2f} s batched vs ~{k * one_run:.2f} s as separate runs")
+    print(f"median growth rate {summary['median_rate']:.3g} per time unit, "
+          f"e-folding time {summary['e_folding_time']:.3g}, final median distance {summary['final_median_distance']:.3g}")
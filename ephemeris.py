@@ -0,0 +1,264 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import data
+
+# Records per Horizons request (the API caps tables at about 90k lines)
+MAX_RECORDS = 20000
+# Longest playback span, in years
+MAX_YEARS = 200
+# Grid points per shortest orbital period in the fetched tables
+SAMPLES_PER_ORBIT = 24
+# Interpolation error allowed when thinning the tables, relative to the
+# system size (1000 simulator units, so 1e-4 is 0.1 units)
+TOLERANCE = 1e-4
+
+SECONDS_PER_DAY = 86400
+_EPOCH = datetime.strptime(data.EPOCH, "%Y-%m-%d")
+_JD_UNIX = 2440587.5
+_JD_PATTERN = re.compile(r'(\d+\.\d+)\s*=\s*A\.D\.')
+_NUMBER_PATTERN = re.compile(r'[+-]?\d+\.\d+E[+-]\d+')
+
+def _julian_date(moment):
+    return _JD_UNIX + (moment - datetime(1970, 1, 1)).total_seconds() / SECONDS_PER_DAY
+
+def _horizons_time(seconds):
+    """Horizons time string for seconds after data.EPOCH, quoted like COMMAND since it contains a space."""
+    return f"'{_EPOCH + timedelta(seconds=seconds):%Y-%m-%d %H:%M}'"
+
+def _step_string(step_seconds):
+    """Horizons STEP_SIZE for a step in seconds, in whole minutes."""
+    minutes = max(1, int(step_seconds // 60))
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440}d"
+    if minutes % 60 == 0:
+        return f"{minutes // 60}h"
+    return f"{minutes}m"
+
+def format_time(seconds):
+    """Calendar date of a time in seconds after data.EPOCH."""
+    return f"{_EPOCH + timedelta(seconds=float(seconds)):%Y-%m-%d}"
+
+def parse_series(result_text, body_id):
+    """(times, pos, vel) from a Horizons VEC_TABLE 2 result; times in seconds after data.EPOCH."""
+    match = re.search(r'\$\$SOE(.*?)\$\$EOE', result_text, re.DOTALL)
+    if not match:
+        raise ValueError(f"Could not parse vector data for body {body_id}")
+    block = match.group(1)
+    jd = np.array([float(x) for x in _JD_PATTERN.findall(block)])
+    numbers = np.array([float(x) for x in _NUMBER_PATTERN.findall(block)]).reshape(-1, 6)
+    if len(jd) != len(numbers):
+        raise ValueError(f"Malformed vector table for body {body_id}")
+    times = (jd - _julian_date(_EPOCH)) * SECONDS_PER_DAY
+    return times, numbers[:, :3], numbers[:, 3:]
+
+def fetch_series(body_id, center, start, stop, step, session=None):
+    """
+    Vector table of one body from start to stop (seconds after data.EPOCH)
+    every step seconds, in one request. Cached like data.fetch_state.
+    Returns (times, pos, vel) with pos/vel in km and km/s.
+    """
+    params = {
+        "format": "json",
+        "COMMAND": f"'{body_id}'",
+        "EPHEM_TYPE": "VECTORS",
+        "CENTER": center,
+        "START_TIME": _horizons_time(start),
+        "STOP_TIME": _horizons_time(stop),
+        "STEP_SIZE": _step_string(step),
+        "OUT_UNITS": data.OUT_UNITS,
+        "VEC_TABLE": "2",
+        "VEC_LABELS": "NO",
+    }
+    key = {"url": data.BASE_URL, **params}
+    cached = data.ephemeris_cache.get("series", key, expire=not data.OFFLINE)
+    if cached is not None:
+        arrays, _ = cached
+        return arrays["times"], arrays["pos"], arrays["vel"]
+    if data.OFFLINE:
+        raise data.OfflineError(f"Series for body {body_id} (center {center})")
+
+    session = session or data.get_session()
+    r = session.get(data.BASE_URL, params=params, timeout=data.REQUEST_TIMEOUT)
+    r.raise_for_status()
+    times, pos, vel = parse_series(r.json()["result"], body_id)
+    data.ephemeris_cache.put("series", key, {"times": times, "pos": pos, "vel": vel})
+    return times, pos, vel
+
+class HermiteTrack:
+    """
+    Piecewise cubic Hermite interpolant of one body's position on a uniform
+    time grid, built from positions and velocities at the nodes. Segment
+    lookup is a single floor division, so evaluation is O(1) per time and
+    vectorized over arrays of times. Times outside the grid are clamped.
+    """
+
+    def __init__(self, t0, step, pos, vel):
+        self.t0 = float(t0)
+        self.step = float(step)
+        self.pos = np.ascontiguousarray(pos, dtype=np.float64)
+        self.vel = np.ascontiguousarray(vel, dtype=np.float64)
+
+    @property
+    def t1(self):
+        return self.t0 + self.step * (len(self.pos) - 1)
+
+    def _locate(self, t):
+        u = (np.clip(np.asarray(t, dtype=np.float64), self.t0, self.t1) - self.t0) / self.step
+        k = np.minimum(np.floor(u).astype(np.int64), len(self.pos) - 2)
+        return k, (u - k)[..., np.newaxis]
+
+    def __call__(self, t):
+        """Positions at time(s) t: shape (3,) for a scalar, (M, 3) for an array."""
+        k, s = self._locate(t)
+        s2, s3 = s * s, s * s * s
+        h00 = 2 * s3 - 3 * s2 + 1
+        h10 = s3 - 2 * s2 + s
+        h01 = -2 * s3 + 3 * s2
+        h11 = s3 - s2
+        return (h00 * self.pos[k] + h10 * self.step * self.vel[k]
+                + h01 * self.pos[k + 1] + h11 * self.step * self.vel[k + 1])
+
+    def velocity(self, t):
+        """Derivative of the interpolant at time(s) t."""
+        k, s = self._locate(t)
+        s2 = s * s
+        d00 = (6 * s2 - 6 * s) / self.step
+        d10 = 3 * s2 - 4 * s + 1
+        d01 = -d00
+        d11 = 3 * s2 - 2 * s
+        return d00 * self.pos[k] + d10 * self.vel[k] + d01 * self.pos[k + 1] + d11 * self.vel[k + 1]
+
+    @classmethod
+    def fit(cls, t0, step, pos, vel, tol):
+        """
+        Track over a dense table that keeps only every stride-th node, with
+        the largest power-of-two stride whose error at the dropped nodes
+        stays within tol. The table tail past the last whole stride is cut.
+        """
+        best = cls(t0, step, pos, vel)
+        times = t0 + step * np.arange(len(pos))
+        stride = 2
+        while (len(pos) - 1) // stride >= 2:
+            last = (len(pos) - 1) // stride * stride
+            track = cls(t0, step * stride, pos[:last + 1:stride], vel[:last + 1:stride])
+            err = np.linalg.norm(track(times[:last + 1]) - pos[:last + 1], axis=1).max()
+            if err > tol:
+                break
+            best = track
+            stride *= 2
+        return best
+
+class Ephemeris:
+    """
+    Precomputed motion of a preset for playback: one HermiteTrack per body,
+    shifted and scaled into the same simulator units as
+    data.get_system_data (lengths times length_scale, centered on the
+    primary's position at data.EPOCH). Times are seconds after data.EPOCH.
+    """
+
+    def __init__(self, tracks, masses, names, colors, length_scale, offset):
+        self.tracks = tracks
+        self.masses = np.asarray(masses, dtype=np.float64)
+        self.names = list(names)
+        self.colors = list(colors)
+        self.length_scale = length_scale
+        self.offset = np.asarray(offset, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    @property
+    def span(self):
+        """(start, stop) covered by every track."""
+        return max(t.t0 for t in self.tracks), min(t.t1 for t in self.tracks)
+
+    def positions(self, t):
+        """Body positions at time(s) t: (N, 3) for a scalar, (M, N, 3) for an array."""
+        pos = np.stack([track(t) for track in self.tracks], axis=-2)
+        return (pos - self.offset) * self.length_scale
+
+    def velocities(self, t):
+        """Body velocities in km/s at time(s) t, shaped like positions()."""
+        return np.stack([track.velocity(t) for track in self.tracks], axis=-2)
+
+    def nodes(self):
+        """Total number of Hermite nodes kept, versus the fetched table sizes."""
+        return sum(len(t.pos) for t in self.tracks)
+
+def playback_grid(system_name):
+    """
+    Default (start, stop, step) in seconds after data.EPOCH for a preset: a
+    step of SAMPLES_PER_ORBIT points per shortest orbit of the loaded
+    system, and a span centered on the epoch of at most MAX_RECORDS steps
+    or MAX_YEARS years.
+    """
+    package = data.get_system_data(system_name)
+    state, G = package["state"], package["G"]
+    primary = int(np.argmax(state.masses))
+    others = np.arange(len(state)) != primary
+    r = np.linalg.norm(state.pos[others] - state.pos[primary], axis=1)
+    period = 2 * np.pi * np.sqrt(r ** 3 / (G * (state.masses[primary] + state.masses[others])))
+    step = max(60.0, period.min() * package["time_unit"] / SAMPLES_PER_ORBIT)
+    step = 60.0 * (step // 60)
+    # Whole steps either side, so the epoch itself is a grid node
+    half = step * (min(MAX_RECORDS * step, MAX_YEARS * 365.25 * SECONDS_PER_DAY) / 2 // step)
+    return -half, half, step
+
+def load_ephemeris(system_name, start=None, stop=None, step=None, tol=TOLERANCE, max_workers=data.MAX_WORKERS):
+    """
+    Fetches dense vector tables for every body of a preset concurrently (or
+    from the cache), thins each into a HermiteTrack within tol and returns
+    an Ephemeris. start/stop/step default to playback_grid(system_name).
+    """
+    config = data.SYSTEMS.get(system_name)
+    if config is None:
+        raise ValueError(f"Unknown system: {system_name}")
+    if config.get("static"):
+        raise ValueError(f"{system_name} has no ephemeris to play back")
+    if start is None or stop is None or step is None:
+        start, stop, step = playback_grid(system_name)
+
+    center = f"'{config['center']}'"
+    bodies = config["bodies"]
+    session = data.get_session()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(bodies)))) as pool:
+        futures = [pool.submit(fetch_series, b[0], center, start, stop, step, session) for b in bodies]
+    series = [f.result() for f in futures]
+
+    # Same frame and scale as data.get_system_data at the epoch
+    at_epoch = np.array([pos[np.argmin(np.abs(times))] for times, pos, _ in series])
+    offset = at_epoch[0]
+    max_dist = np.linalg.norm(at_epoch - offset, axis=1).max() or 1
+    length_scale = 1000 / max_dist
+
+    tracks = []
+    for times, pos, vel in series:
+        if len(times) < 2:
+            raise ValueError(f"Need at least two records per body, got {len(times)}")
+        grid_step = (times[-1] - times[0]) / (len(times) - 1)
+        tracks.append(HermiteTrack.fit(times[0], grid_step, pos, vel, tol * max_dist))
+    masses = [b[1] for b in bodies]
+    return Ephemeris(tracks, 1000000 * np.asarray(masses) / max(masses), [b[2] for b in bodies],
+                     [b[3] for b in bodies], length_scale, offset)
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "Jovian System"
+    t0 = time.perf_counter()
+    try:
+        eph = load_ephemeris(name)
+    except data.OfflineError as e:
+        sys.exit(f"ephemeris: {e}")
+    loaded = time.perf_counter() - t0
+    start, stop = eph.span
+    times = np.linspace(start, stop, 100000)
+    t0 = time.perf_counter()
+    eph.positions(times)
+    evaluated = time.perf_counter() - t0
+    print(f"{name}: {len(eph)} bodies over {(stop - start) / 86400 / 365.25:.1f} years, "
+          f"{eph.nodes()} Hermite nodes, loaded in {loaded:.2f} s")
+    print(f"100000 epochs evaluated in {evaluated * 1000:.1f} ms")
@@ -0,0 +1,127 @@
+"""
+Command-line entry point for headless runs:
+
+    python -m gravity run --system "Solar System" --years 100 --out traj.npy
+    python -m gravity run --resume run.ckpt --years 100 --checkpoint run.ckpt
+    python -m gravity systems
+    python -m gravity cache [--clear]
+    python -m gravity sweep --systems TRAPPIST-1 --integrators rk4 leapfrog
+    python -m gravity bench run --quick --baseline baseline.json
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+import checkpoint
+import data
+import physics
+from simulation import Simulation
+
+def cmd_systems(args):
+    for name in data.SYSTEMS:
+        print(name)
+
+def cmd_cache(args):
+    if args.clear:
+        data.ephemeris_cache.clear()
+    stats = data.ephemeris_cache.stats()
+    print(f"{stats['entries']} entries, {stats['bytes'] / 1024:.1f} KiB in {stats['directory']}")
+
+def cmd_run(args):
+    if args.offline:
+        data.set_offline(True)
+    if args.resume:
+        sim = checkpoint.load_checkpoint(args.resume)
+        print(f"Resumed {sim.system} at {sim.years:.2f} years ({sim.steps} steps, {sim.integrator})")
+    else:
+        sim = Simulation.from_system(args.system, dt=args.dt, integrator=args.integrator)
+    steps_before = sim.steps
+    duration = sim.years_to_time(args.years) if args.years is not None else args.time
+
+    def progress(done, total):
+        sys.stdout.write(f"\r{done}/{total} steps")
+        sys.stdout.flush()
+
+    if args.record:
+        sim.start_recording(args.record)
+    start = time.perf_counter()
+    times, positions = sim.run(duration, args.record_every, progress=progress)
+    elapsed = time.perf_counter() - start
+    if args.record:
+        frames = sim.recorder.frames
+        sim.stop_recording()
+        print(f"\nRecorded {frames} frames with velocities to {args.record}", end="")
+    steps = sim.steps - steps_before
+    print(f"\n{steps} steps in {elapsed:.2f} s ({steps / max(elapsed, 1e-9):.0f} steps/s), "
+          f"{sim.years:.2f} years simulated")
+    if args.checkpoint:
+        checkpoint.save_checkpoint(sim, args.checkpoint)
+        print(f"Saved checkpoint to {args.checkpoint}")
+
+    if args.out:
+        np.save(args.out, positions)
+        meta = {
+            "system": sim.system,
+            "names": sim.state.names,
+            "G": sim.G,
+            "dt": sim.dt,
+            "integrator": sim.integrator,
+            "time_unit": sim.time_unit,
+            "length_scale": sim.length_scale,
+            "record_every": args.record_every,
+            "t_first": float(times[0]) if len(times) else None,
+            "t_step": sim.dt * args.record_every,
+        }
+        meta_path = args.out[:-4] + ".json" if args.out.endswith(".npy") else args.out + ".json"
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        print(f"Wrote {positions.shape} positions to {args.out} and metadata to {meta_path}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="gravity", description="Headless orbital simulator.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="integrate a preset system without a display")
+    run.add_argument("--system", default="Solar System", choices=list(data.SYSTEMS))
+    span = run.add_mutually_exclusive_group()
+    span.add_argument("--years", type=float, default=None, help="simulated years")
+    span.add_argument("--time", type=float, default=100.0, help="simulated time units (default)")
+    run.add_argument("--dt", type=float, default=0.01)
+    run.add_argument("--integrator", default="rk4", choices=physics.integrator_names())
+    run.add_argument("--record-every", type=int, default=10, help="steps between recorded positions")
+    run.add_argument("--out", default=None, help=".npy file for the (n_records, N, 3) positions")
+    run.add_argument("--record", default=None, help="trajectory file (recorder.py format) with positions and velocities")
+    run.add_argument("--resume", default=None, metavar="CKPT", help="continue from a checkpoint instead of --system")
+    run.add_argument("--checkpoint", default=None, metavar="OUT", help="save the final state as a checkpoint")
+    run.add_argument("--offline", action="store_true", help="use cached ephemerides only")
+    run.set_defaults(func=cmd_run)
+
+    systems = sub.add_parser("systems", help="list preset systems")
+    systems.set_defaults(func=cmd_systems)
+
+    cache = sub.add_parser("cache", help="show or clear the ephemeris cache")
+    cache.add_argument("--clear", action="store_true")
+    cache.set_defaults(func=cmd_cache)
+
+    sub.add_parser("sweep", help="parameter sweep, arguments as for sweep.py", add_help=False)
+    sub.add_parser("bench", help="hot-path benchmarks, arguments as for bench.py", add_help=False)
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    try:
+        if argv[:1] == ["sweep"]:
+            # Everything after "sweep" belongs to sweep.py's own parser
+            import sweep
+            return sweep.main(argv[1:])
+        if argv[:1] == ["bench"]:
+            import bench
+            return bench.main(argv[1:])
+
+        args = parser.parse_args(argv)
+        return args.func(args)
+    except data.OfflineError as e:
+        print(f"\ngravity: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Local stand-in for the JPL Horizons vectors API, for testing and
+benchmarking without network access:
+
+    python horizons_stub.py --port 8765 --latency 0.2
+    HORIZONS_URL=http://127.0.0.1:8765/api/horizons.api python main.py
+
+Every body of data.SYSTEMS gets a circular orbit about its system's
+center, so the returned vectors are deterministic and dynamically sane.
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import data
+
+G_REAL = 6.67430e-20  # km^3 kg^-1 s^-2
+# Orbit radius per position in the body list, in km, by center
+SPACING_KM = {"500@0": 0.6 * data.AU_KM}
+DEFAULT_SPACING_KM = 2.5e5
+
+PATH = "/api/horizons.api"
+_STEP_UNITS = {"d": 86400, "h": 3600, "m": 60}
+
+def _orbits():
+    """(body_id, center) -> (radius km, mu of the center, phase, inclination)."""
+    orbits = {}
+    for config in data.SYSTEMS.values():
+        if config.get("static"):
+            continue
+        center = config["center"]
+        primary_mass = config["bodies"][0][1]
+        spacing = SPACING_KM.get(center, DEFAULT_SPACING_KM)
+        for k, (body_id, _, _, _) in enumerate(config["bodies"]):
+            orbits[(body_id, center)] = (k * spacing, G_REAL * primary_mass, 2.4 * k, 0.02 * k)
+    return orbits
+
+ORBITS = _orbits()
+
+def body_vectors(body_id, center, seconds):
+    """Position (km) and velocity (km/s) of body_id about center at the given times."""
+    radius, mu, phase, inc = ORBITS.get((body_id, center), (0.0, 1.0, 0.0, 0.0))
+    seconds = np.atleast_1d(np.asarray(seconds, dtype=np.float64))
+    if radius == 0:
+        zeros = np.zeros((len(seconds), 3))
+        return zeros, zeros.copy()
+    n = np.sqrt(mu / radius ** 3)
+    angle = phase + n * seconds
+    speed = n * radius
+    cos_i, sin_i = np.cos(inc), np.sin(inc)
+    pos = radius * np.stack([np.cos(angle), np.sin(angle) * cos_i, np.sin(angle) * sin_i], axis=1)
+    vel = speed * np.stack([-np.sin(angle), np.cos(angle) * cos_i, np.cos(angle) * sin_i], axis=1)
+    return pos, vel
+
+def _parse_time(text):
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text.strip(), fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"Unsupported time: {text}")
+
+def _epochs(start, stop, step):
+    t0 = _parse_time(start)
+    t1 = _parse_time(stop)
+    count, unit = int(step[:-1] or 1), step[-1]
+    delta = timedelta(seconds=count * _STEP_UNITS[unit])
+    epochs = []
+    t = t0
+    while t <= t1:
+        epochs.append(t)
+        t += delta
+    return epochs
+
+def vectors_result(body_id, center, start, stop, step="1d"):
+    """Horizons-style result text (VEC_TABLE 2, no labels) between start and stop."""
+    epochs = _epochs(start, stop, step)
+    reference = datetime(2000, 1, 1, 12)
+    seconds = [(t - reference).total_seconds() for t in epochs]
+    pos, vel = body_vectors(body_id, center, seconds)
+    lines = [f"Target body: {body_id}  Center: {center}  (horizons_stub)", "$$SOE"]
+    for t, sec, p, v in zip(epochs, seconds, pos, vel):
+        jd = 2451545.0 + sec / 86400
+        lines.append(f"{jd:.9f} = A.D. {t:%Y-%b-%d %H:%M:%S}.0000 TDB ")
+        lines.append(" " + " ".join(f"{x:.15E}" for x in p))
+        lines.append(" " + " ".join(f"{x:.15E}" for x in v))
+    lines.append("$$EOE")
+    return "\n".join(lines) + "\n"
+
+class HorizonsHandler(BaseHTTPRequestHandler):
+    # Set on the handler subclass built by make_server
+    latency = 0.0
+    failures = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != PATH:
+            self.send_error(404)
+            return
+        query = {k: v[0].strip("'") for k, v in parse_qs(url.query).items()}
+        time.sleep(self.latency)
+        if self.failures is not None and self.failures.take():
+            self.send_error(503, "Injected failure")
+            return
+
+        try:
+            result = vectors_result(query["COMMAND"], query.get("CENTER", "500@0"),
+                                    query["START_TIME"], query["STOP_TIME"], query.get("STEP_SIZE", "1d"))
+        except (KeyError, ValueError) as e:
+            self.send_error(400, str(e))
+            return
+        body = json.dumps({"result": result, "signature": {"source": "horizons_stub"}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _Failures:
+    """Thread-safe countdown of requests to fail with 503."""
+
+    def __init__(self, count):
+        self.count = count
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            if self.count > 0:
+                self.count -= 1
+                return True
+            return False
+
+def make_server(port=0, latency=0.0, fail_first=0, host="127.0.0.1"):
+    """
+    Threaded stub server; port 0 picks a free port.
+    latency: seconds each request waits before answering
+    fail_first: number of initial requests answered with 503, to exercise retries
+    """
+    handler = type("Handler", (HorizonsHandler,), {"latency": latency, "failures": _Failures(fail_first)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def serve_in_background(**options):
+    """Starts make_server(**options) on a daemon thread; returns (server, url)."""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, name="horizons-stub", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}{PATH}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stub of the JPL Horizons vectors API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with 503")
+    args = parser.parse_args(argv)
+    server = make_server(args.port, args.latency, args.fail_first)
+    print(f"Serving on http://127.0.0.1:{server.server_address[1]}{PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import time
+import data
+import physics
+
+# Simulated time covered by every run, in simulator time units
+SPAN = 20.0
+TIME_STEPS = (0.04, 0.02, 0.01, 0.005)
+
+def compare_integrators(state, G, span=SPAN, time_steps=TIME_STEPS, methods=None):
+    """
+    Runs every fixed-step integrator for each dt, plus dopri5 at matching
+    tolerances, and records the worst relative energy error against wall-clock.
+    """
+    methods = methods or physics.integrator_names()
+    e0 = physics.total_energy(state, G)
+    rows = []
+    for method in methods:
+        if method in physics.ADAPTIVE_INTEGRATORS:
+            settings = [(span / 100, {"rtol": tol, "atol": tol * 1e-2}) for tol in (1e-6, 1e-8, 1e-10)]
+        else:
+            settings = [(dt, {}) for dt in time_steps]
+
+        for dt, options in settings:
+            sim = state.copy()
+            accel = physics.counting(physics.get_acceleration)
+            step = physics.get_integrator(method, accel, **options)
+            max_err = 0.0
+            elapsed = 0.0
+            for _ in range(int(round(span / dt))):
+                t0 = time.perf_counter()
+                step(sim, dt, G)
+                elapsed += time.perf_counter() - t0
+                max_err = max(max_err, abs((physics.total_energy(sim, G) - e0) / e0))
+            rows.append({
+                "method": method,
+                "dt": dt,
+                "options": options,
+                "max_rel_energy_error": max_err,
+                "seconds": elapsed,
+                "force_evals": accel.calls,
+            })
+    return rows
+
+if __name__ == "__main__":
+    for name in data.SYSTEMS:
+        try:
+            package = data.get_system_data(name)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+
+        print(f"\n{name}")
+        print(f"{'method':>13} {'dt / rtol':>10} {'max |dE/E|':>12} {'seconds':>9} {'evals':>7}")
+        for row in compare_integrators(package["state"], package["G"]):
+            setting = row["options"].get("rtol", row["dt"])
+            print(f"{row['method']:>13} {setting:>10.0e} {row['max_rel_energy_error']:>12.3e} "
+                  f"{row['seconds']:>9.3f} {row['force_evals']:>7}")
@@ -0,0 +1,148 @@
+import numpy as np
+
+# |z| below which the Stumpff functions are summed as series (no cancellation)
+_SERIES_Z = 1.0
+_SERIES_TERMS = 12
+# Laguerre-Conway order and iteration limits for the universal Kepler equation
+_LAGUERRE_N = 5
+_MAX_ITER = 50
+_TOL = 1e-14
+
+def stumpff(z):
+    """
+    Stumpff functions C(z) = c2(z) and S(z) = c3(z), vectorized.
+    z = alpha * chi^2 is positive on ellipses and negative on hyperbolae.
+    """
+    z = np.asarray(z, dtype=np.float64)
+    C = np.empty_like(z)
+    S = np.empty_like(z)
+
+    small = np.abs(z) < _SERIES_Z
+    if small.any():
+        zs = z[small]
+        c, s = np.zeros_like(zs), np.zeros_like(zs)
+        term_c, term_s = np.full_like(zs, 1 / 2), np.full_like(zs, 1 / 6)
+        for k in range(_SERIES_TERMS):
+            c += term_c
+            s += term_s
+            term_c = term_c * -zs / ((2 * k + 3) * (2 * k + 4))
+            term_s = term_s * -zs / ((2 * k + 4) * (2 * k + 5))
+        C[small], S[small] = c, s
+
+    ell = z >= _SERIES_Z
+    if ell.any():
+        sz = np.sqrt(z[ell])
+        C[ell] = 2 * np.sin(sz / 2) ** 2 / z[ell]
+        S[ell] = (sz - np.sin(sz)) / sz ** 3
+
+    hyp = z <= -_SERIES_Z
+    if hyp.any():
+        sz = np.sqrt(-z[hyp])
+        C[hyp] = 2 * np.sinh(sz / 2) ** 2 / -z[hyp]
+        S[hyp] = (np.sinh(sz) - sz) / sz ** 3
+
+    return C, S
+
+def kepler_drift(pos, vel, mu, dt):
+    """
+    Propagates two-body orbits about a fixed centre analytically.
+    pos, vel: (N, 3) positions and velocities relative to the centre
+    mu: G * M of the centre
+    Solves the universal-variable Kepler equation for all bodies at once with
+    Laguerre-Conway iterations, so elliptic, parabolic and hyperbolic orbits
+    are handled alike. Returns (new_pos, new_vel).
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    vel = np.asarray(vel, dtype=np.float64)
+    if len(pos) == 0 or dt == 0:
+        return pos.copy(), vel.copy()
+
+    sqrt_mu = np.sqrt(mu)
+    r0 = np.linalg.norm(pos, axis=1)
+    sigma0 = np.einsum('ij,ij->i', pos, vel) / sqrt_mu
+    alpha = 2 / r0 - np.einsum('ij,ij->i', vel, vel) / mu  # 1 / semi-major axis
+
+    # Initial guess: mean motion on bound orbits, straight line otherwise
+    chi = np.where(alpha > 0, sqrt_mu * alpha * dt, sqrt_mu * dt / r0)
+
+    n = _LAGUERRE_N
+    active = np.ones(len(pos), dtype=bool)
+    for _ in range(_MAX_ITER):
+        c, a, s0, r = chi[active], alpha[active], sigma0[active], r0[active]
+        z = a * c * c
+        C, S = stumpff(z)
+        G0 = 1 - z * C
+        G1 = c * (1 - z * S)
+        G2 = c * c * C
+        G3 = c ** 3 * S
+
+        F = r * G1 + s0 * G2 + G3 - sqrt_mu * dt
+        dF = r * G0 + s0 * G1 + G2
+        ddF = s0 * G0 + (1 - a * r) * G1
+        root = np.sqrt(np.abs((n - 1) ** 2 * dF * dF - n * (n - 1) * F * ddF))
+        delta = n * F / (dF + np.copysign(root, dF))
+
+        chi[active] = c - delta
+        converged = np.abs(delta) <= _TOL * np.maximum(1.0, np.abs(c))
+        idx = np.flatnonzero(active)
+        active[idx[converged]] = False
+        if not active.any():
+            break
+
+    z = alpha * chi * chi
+    C, S = stumpff(z)
+    G1 = chi * (1 - z * S)
+    G2 = chi * chi * C
+    G3 = chi ** 3 * S
+    r = r0 * (1 - z * C) + sigma0 * G1 + G2
+
+    # Lagrange f and g coefficients
+    f = 1 - G2 / r0
+    g = dt - G3 / sqrt_mu
+    f_dot = -sqrt_mu * G1 / (r * r0)
+    g_dot = 1 - G2 / r
+
+    new_pos = f[:, np.newaxis] * pos + g[:, np.newaxis] * vel
+    new_vel = f_dot[:, np.newaxis] * pos + g_dot[:, np.newaxis] * vel
+    return new_pos, new_vel
+
+def eccentric_anomaly(M, e):
+    """Solves Kepler's equation E - e sin E = M for elliptic orbits, vectorized."""
+    M = np.asarray(M, dtype=np.float64)
+    e = np.asarray(e, dtype=np.float64)
+    E = np.where(e < 0.8, M, np.pi * np.ones_like(M))
+    for _ in range(_MAX_ITER):
+        delta = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        E = E - delta
+        if np.all(np.abs(delta) <= _TOL):
+            break
+    return E
+
+def elements_to_cartesian(a, e, inc, node, peri, M, mu):
+    """
+    Position and velocity relative to the centre from Keplerian elements.
+    a: semi-major axis, e: eccentricity (< 1), inc/node/peri/M: inclination,
+    longitude of ascending node, argument of pericentre and mean anomaly in
+    radians, all broadcastable arrays. Returns (pos, vel), each (N, 3).
+    """
+    a, e, inc, node, peri, M = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (a, e, inc, node, peri, M)))
+    E = eccentric_anomaly(M, e)
+    cos_E, sin_E = np.cos(E), np.sin(E)
+    b = a * np.sqrt(1 - e * e)
+    r = a * (1 - e * cos_E)
+
+    # Perifocal frame
+    x, y = a * (cos_E - e), b * sin_E
+    n = np.sqrt(mu / a ** 3)
+    vx, vy = -a * n * sin_E * a / r, b * n * cos_E * a / r
+
+    cO, sO = np.cos(node), np.sin(node)
+    cw, sw = np.cos(peri), np.sin(peri)
+    ci, si = np.cos(inc), np.sin(inc)
+    # Columns of the perifocal -> reference rotation
+    P = np.stack([cO * cw - sO * sw * ci, sO * cw + cO * sw * ci, sw * si], axis=-1)
+    Q = np.stack([-cO * sw - sO * cw * ci, -sO * sw + cO * cw * ci, cw * si], axis=-1)
+
+    pos = x[..., np.newaxis] * P + y[..., np.newaxis] * Q
+    vel = vx[..., np.newaxis] * P + vy[..., np.newaxis] * Q
+    return pos, vel
@@ -1,172 +1,382 @@
+import os
+import sys
 import pygame
 import numpy as np
-from math import log10, pi
+from math import pi
+import cache
+import checkpoint
 import data
+import ephemeris
+import particles
 import physics
+from profiling import profiler
+import recorder
+import simulation
 import ui
 import visualization
 
-# Initialize Pygame
-pygame.init()
-screen = pygame.display.set_mode((visualization.SCREEN_WIDTH, visualization.SCREEN_HEIGHT))
-pygame.display.set_caption("Orbital Mechanics Simulator (RK4)")
-ui.init_fonts()
-
-# --- Camera state (Target and Current for Lerping) ---
-cam_r_target = 800
-cam_theta_target = pi / 4
-cam_phi_target = pi / 6
-
-cam_r = cam_r_target
-cam_theta = cam_theta_target
-cam_phi = cam_phi_target
-
-dragging = False
-last_mouse = (0, 0)
-cam_lerp_speed = 0.12
-
-# Main game objects
-running = True
-frame_count = 0
-selector = ui.SystemSelector()
-starfield = visualization.Starfield(350)
-clock = pygame.time.Clock()
-
-def load_system(name):
+# Extra pixels around the screen in which bodies are still drawn, for their labels
+LABEL_MARGIN = 150
+
+# Test particles seeded with the B key, shared between the system's populations
+TEST_PARTICLES = 2000
+
+# Chrome trace written when tracing (T key) stops, next to checkpoints and recordings
+TRACE_PATH = os.path.join(cache.DEFAULT_DIR, "gravity-trace.json")
+
+def load_system(name, integrator="rk4", resume=True):
+    """Resumes name from its preset checkpoint if there is one, else loads it fresh."""
+    path = checkpoint.preset_path(name)
+    if resume and os.path.exists(path):
+        try:
+            sim = checkpoint.load_checkpoint(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring checkpoint {path}: {e}")
+        else:
+            print(f"Resuming system: {name}")
+            return sim
     print(f"Loading system: {name}")
-    data_package = data.get_system_data(name)
-    return data_package["state"], data_package["G"]
-
-state, G = load_system("Solar System")
-dt = 0.01
-
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        # Handle UI events
-        new_system = selector.handle_event(event)
-        if new_system:
-            selector.loading = True
-            starfield.draw(screen, cam_theta, cam_phi)
-            selector.draw(screen)
-            pygame.display.flip()
+    return simulation.Simulation.from_system(name, dt=0.01, integrator=integrator)
+
+def save_system(sim):
+    """Writes sim to its preset checkpoint, so returning to the system resumes it."""
+    try:
+        checkpoint.save_checkpoint(sim, checkpoint.preset_path(sim.system))
+    except OSError as e:
+        print(f"Could not save checkpoint: {e}")
+
+def main():
+    # Initialize Pygame
+    pygame.init()
+    screen = pygame.display.set_mode((visualization.SCREEN_WIDTH, visualization.SCREEN_HEIGHT))
+    pygame.display.set_caption("Orbital Mechanics Simulator")
+    ui.init_fonts()
+
+    # --- Camera state (Target and Current for Lerping) ---
+    cam_r_target = 800
+    cam_theta_target = pi / 4
+    cam_phi_target = pi / 6
+
+    cam_r = cam_r_target
+    cam_theta = cam_theta_target
+    cam_phi = cam_phi_target
+
+    dragging = False
+    last_mouse = (0, 0)
+    cam_lerp_speed = 0.12
+
+    # Main game objects
+    running = True
+    frame_count = 0
+    selector = ui.SystemSelector()
+    starfield = visualization.Starfield(350)
+    trail_renderer = visualization.TrailRenderer()
+    clock = pygame.time.Clock()
+    # Profiler overlay (H key); GRAVITY_PROFILE=1 starts with it shown
+    hud = ui.ProfilerHUD() if profiler.enabled else None
+
+    try:
+        sim = load_system("Solar System", selector.integrator)
+    except data.OfflineError as e:
+        pygame.quit()
+        sys.exit(f"gravity: {e}")
+    selector.integrator = sim.integrator
+    # Physics runs on its own thread; the loop below only renders snapshots
+    worker = simulation.PhysicsWorker(sim).start()
+    # Ephemeris playback (P key): positions come from interpolated Horizons
+    # tables instead of the integrator; play_t is in seconds after data.EPOCH
+    playback = None
+    play_t = 0.0
+    play_direction = 1
+    # Trajectory replay (R records, V replays): a TrajectoryReader and the
+    # current frame index, scrubbed without any recomputation
+    replay = None
+    replay_i = 0
+
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+            # Handle UI events
+            new_system = selector.handle_event(event)
+            if new_system:
+                selector.loading = True
+                starfield.draw(screen, cam_theta, cam_phi)
+                selector.draw(screen)
+                pygame.display.flip()
             
-            state, G = load_system(new_system)
-            selector.current_system = new_system
-            selector.loading = False
-            frame_count = 0
-            cam_r_target = 1500 if ("System" in new_system and new_system != "Solar System") else 800
-
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            # Check if click was on UI
-            ui_rect = selector.rect
-            if not ui_rect.collidepoint(event.pos):
+                try:
+                    with worker.lock:
+                        sim.stop_recording()
+                        save_system(sim)
+                        sim = load_system(new_system, selector.integrator)
+                        worker.replace(sim)
+                        worker.paused = False
+                except data.OfflineError as e:
+                    # Stay on the current system
+                    print(e)
+                    selector.status = "NOT CACHED (OFFLINE)"
+                    selector.loading = False
+                    continue
+                selector.integrator = sim.integrator
+                playback = None
+                replay = None
+                selector.status = None
+                selector.current_system = new_system
+                selector.loading = False
+                frame_count = 0
+                cam_r_target = 1500 if ("System" in new_system and new_system != "Solar System") else 800
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_i:
+                # Cycle through the available integrators
+                names = physics.integrator_names()
+                selector.integrator = names[(names.index(selector.integrator) + 1) % len(names)]
+                with worker.lock:
+                    sim.set_integrator(selector.integrator)
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_x and playback is None and replay is None:
+                # Drop this system's checkpoint and start over from fresh data
+                try:
+                    with worker.lock:
+                        fresh = load_system(selector.current_system, selector.integrator, resume=False)
+                        sim.stop_recording()
+                        try:
+                            os.remove(checkpoint.preset_path(selector.current_system))
+                        except FileNotFoundError:
+                            pass
+                        sim = fresh
+                        worker.replace(sim)
+                except data.OfflineError as e:
+                    print(e)
+                    selector.status = "NOT CACHED (OFFLINE)"
+                    continue
+                selector.status = None
+                frame_count = 0
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                # Toggle the profiler and its HUD; a running trace keeps it enabled
+                hud = None if hud is not None else ui.ProfilerHUD()
+                profiler.set_enabled(hud is not None or profiler.tracing)
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_t:
+                # Start or stop a Chrome trace of every phase
+                if profiler.tracing:
+                    profiler.stop_trace()
+                    print(f"Wrote {profiler.export_trace(TRACE_PATH)} trace events to {TRACE_PATH}")
+                    profiler.set_enabled(hud is not None)
+                else:
+                    profiler.start_trace()
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_b:
+                # Toggle the test-particle populations (belts, rings, Trojans)
+                with worker.lock:
+                    if sim.state.n_test:
+                        sim.state.clear_test_particles()
+                    elif selector.current_system in data.POPULATIONS:
+                        particles.seed_populations(sim.state, sim.G, sim.length_scale, data.POPULATIONS[selector.current_system], TEST_PARTICLES)
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_r and replay is None:
+                # Start or stop recording the live simulation to disk
+                with worker.lock:
+                    if sim.recorder is not None:
+                        print(f"Recorded {sim.recorder.frames} frames to {sim.recorder.path}")
+                        sim.stop_recording()
+                    else:
+                        sim.start_recording(recorder.default_path(system=selector.current_system))
+                selector.status = "RECORDING  [R]" if sim.recorder is not None else None
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_v and playback is None:
+                # Toggle replay of the last recording of this system
+                if replay is not None:
+                    replay = None
+                    worker.paused = False
+                    selector.status = None
+                else:
+                    with worker.lock:
+                        sim.stop_recording()
+                    path = recorder.default_path(system=selector.current_system)
+                    try:
+                        replay = recorder.TrajectoryReader(path)
+                    except (OSError, ValueError) as e:
+                        print(f"Replay unavailable: {e}")
+                    else:
+                        if len(replay) == 0:
+                            print(f"Replay unavailable: {path} has no frames")
+                            replay = None
+                        elif len(replay.names) != len(sim.state):
+                            print(f"Replay unavailable: {path} has {len(replay.names)} bodies, "
+                                  f"{selector.current_system} has {len(sim.state)}")
+                            replay = None
+                        else:
+                            replay_i = len(replay) - 1
+                            play_direction = 0
+                            worker.paused = True
+                            sim.state.trails.clear()
+
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_HOME, pygame.K_END, pygame.K_PAGEUP, pygame.K_PAGEDOWN) and replay is not None:
+                # Seek: to either end, or a tenth of the recorded time back or forward
+                times = replay.times
+                if event.key == pygame.K_HOME:
+                    replay_i = 0
+                elif event.key == pygame.K_END:
+                    replay_i = len(replay) - 1
+                else:
+                    jump = (times[-1] - times[0]) / 10 * (1 if event.key == pygame.K_PAGEUP else -1)
+                    replay_i = replay.index_at(times[replay_i] + jump)
+                sim.state.trails.clear()
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_p and replay is None:
+                # Toggle ephemeris playback, starting from the simulation's current time
+                if playback is not None:
+                    playback = None
+                    worker.paused = False
+                    selector.status = None
+                else:
+                    try:
+                        playback = ephemeris.load_ephemeris(selector.current_system)
+                    except Exception as e:
+                        print(f"Playback unavailable: {e}")
+                    else:
+                        start, stop = playback.span
+                        play_t = min(max(sim.t * sim.time_unit, start), stop)
+                        play_direction = 1
+                        worker.paused = True
+                        sim.state.trails.clear()
+
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_LEFT, pygame.K_RIGHT) and (playback is not None or replay is not None):
+                # Play backwards or forwards through the ephemeris or recording
+                play_direction = -1 if event.key == pygame.K_LEFT else 1
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                # Check if click was on UI
+                ui_rect = selector.rect
+                if not ui_rect.collidepoint(event.pos):
+                    if event.button == 1:
+                        dragging = True
+                        last_mouse = event.pos
+                    elif event.button == 4:  # scroll up
+                        cam_r_target *= 0.85
+                    elif event.button == 5:  # scroll down
+                        cam_r_target *= 1.15
+
+            elif event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 1:
-                    dragging = True
-                    last_mouse = event.pos
-                elif event.button == 4:  # scroll up
-                    cam_r_target *= 0.85
-                elif event.button == 5:  # scroll down
-                    cam_r_target *= 1.15
-
-        elif event.type == pygame.MOUSEBUTTONUP:
-            if event.button == 1:
-                dragging = False
-
-        elif event.type == pygame.MOUSEMOTION and dragging:
-            mx, my = event.pos
-            dx = mx - last_mouse[0]
-            dy = my - last_mouse[1]
-            last_mouse = (mx, my)
-
-            cam_theta_target += dx * 0.003
-            cam_phi_target -= dy * 0.003
-            cam_phi_target = max(-pi / 2 + 0.1, min(pi / 2 - 0.1, cam_phi_target))
-
-    # --- Camera Interpolation (Lerping) ---
-    cam_r += (cam_r_target - cam_r) * cam_lerp_speed
-    cam_theta += (cam_theta_target - cam_theta) * cam_lerp_speed
-    cam_phi += (cam_phi_target - cam_phi) * cam_lerp_speed
+                    dragging = False
+
+            elif event.type == pygame.MOUSEMOTION and dragging:
+                mx, my = event.pos
+                dx = mx - last_mouse[0]
+                dy = my - last_mouse[1]
+                last_mouse = (mx, my)
+
+                cam_theta_target += dx * 0.003
+                cam_phi_target -= dy * 0.003
+                cam_phi_target = max(-pi / 2 + 0.1, min(pi / 2 - 0.1, cam_phi_target))
+
+        profiler.lap("events")
+
+        # --- Camera Interpolation (Lerping) ---
+        cam_r += (cam_r_target - cam_r) * cam_lerp_speed
+        cam_theta += (cam_theta_target - cam_theta) * cam_lerp_speed
+        cam_phi += (cam_phi_target - cam_phi) * cam_lerp_speed
     
-    project_3d = visualization.get_projection_func(cam_r, cam_phi, cam_theta)
+        camera = visualization.Camera(cam_r, cam_phi, cam_theta)
+
+        # --- Calculation ---
+        # The worker ticks at 60 Hz, so the slider keeps its steps-per-frame meaning
+        worker.steps_per_tick = int(selector.speed_slider.val)
+        samples = worker.drain_samples()
+        pos, test_pos = worker.snapshot()
+        state = sim.state
+
+        if playback is not None:
+            # Same simulated seconds per frame as the integrator would cover
+            start, stop = playback.span
+            prev_t = play_t
+            play_t = min(max(play_t + play_direction * worker.steps_per_tick * sim.dt * sim.time_unit, start), stop)
+            samples = playback.positions(np.linspace(prev_t, play_t, 7)[1:])
+            pos = samples[-1]
+            test_pos = np.zeros((0, 3))
+            selector.status = f"EPHEMERIS {ephemeris.format_time(play_t)}  [P]"
 
-    # --- Calculation ---
-    steps_per_frame = int(selector.speed_slider.val)
-    for _ in range(steps_per_frame):
-        state = physics.rk4_step(state, dt, G)
-        
+        elif replay is not None:
+            # One recorded frame per rendered frame, in the chosen direction
+            prev_i = replay_i
+            replay_i = min(max(replay_i + play_direction, 0), len(replay) - 1)
+            lo, hi = sorted((prev_i, replay_i))
+            samples = replay.frames["pos"][lo + 1:hi + 1] if replay_i > prev_i else replay.frames["pos"][lo:hi][::-1]
+            t, pos, _ = replay.frame(replay_i)
+            test_pos = np.zeros((0, 3))
+            selector.status = f"REPLAY {replay_i + 1}/{len(replay)}  t={t:.2f}  [V]"
+
+        profiler.lap("sync")
         # Add trail points with higher detail
-        if frame_count % max(1, steps_per_frame // 6) == 0:
-            for p in state:
-                trail = p[4]
-                pos = (p[1][0], p[2][0], p[3][0])
-                trail.append(pos)
-                if len(trail) > 350:
-                    trail.pop(0)
+        state.trails.extend(samples)
+        profiler.lap("trail_update")
     
-    frame_count += 1
+        frame_count += 1
 
-    # --- Rendering ---
-    # 1. Background
-    starfield.draw(screen, cam_theta, cam_phi)
-    
-    # 2. Trails (Tapered rendering)
-    trail_surface = pygame.Surface((visualization.SCREEN_WIDTH, visualization.SCREEN_HEIGHT), pygame.SRCALPHA)
-    for particle in state:
-        trail = particle[4]
-        if len(trail) < 2: continue
-
-        proj_trail = []
-        step = max(1, len(trail) // 60)
-        for i in range(0, len(trail), step):
-            p = project_3d(*trail[i])
-            if p: proj_trail.append(p)
-        
-        # Always include the last point for precision
-        p_last = project_3d(*trail[-1])
-        if p_last: proj_trail.append(p_last)
-
-        visualization.draw_tapered_trail(trail_surface, proj_trail, particle[6])
-
-    screen.blit(trail_surface, (0, 0))
+        # --- Rendering ---
+        # 1. Background
+        starfield.draw(screen, cam_theta, cam_phi)
+        profiler.lap("background")
     
-    # 3. Bodies
-    drawables = []
-    for particle in state:
-        proj = project_3d(particle[1][0], particle[2][0], particle[3][0])
-        if proj:
-            sx, sy, depth = proj
-            # Perspective-based size
-            vis_size = max(0.5, log10(particle[0]) + 2) if particle[0] > 0 else 1
-            radius = max(1, int(vis_size * 550 / depth))
-            drawables.append((depth, sx, sy, radius, particle[6], particle[5]))
-
-    drawables.sort(key=lambda x: x[0], reverse=True)
-    for depth, sx, sy, r, c, name in drawables:
-        # Core
-        pygame.draw.circle(screen, c, (sx, sy), r)
-        
-        # Subtle Highlight
-        hl_color = [min(255, channel + 100) for channel in c]
-        pygame.draw.circle(screen, hl_color, (sx - r//3, sy - r//3), max(1, r//4))
-        
-        # Label (only for larger bodies or if hovered)
-        if depth < 5500:
-            label_surf = ui._font.render(name, True, (210, 210, 210))
-            screen.blit(label_surf, (sx + r + 10, sy - 10))
-
-    # 4. UI
-    selector.draw(screen)
+        # 2. Trails (Tapered rendering)
+        # Every trail sample is projected at once; only points behind the camera are dropped
+        trail_xy, _, trail_front = camera.project(state.trails.view(), margin=np.inf)
+        capacity = state.trails.capacity
+        proj_trails, trail_colors = [], []
+        for i, (length, color) in enumerate(zip(state.trails.lengths.tolist(), state.colors)):
+            if length < 2: continue
+
+            step = max(1, length // 60)
+            # Always include the last point for precision
+            sel = np.append(np.arange(capacity - length, capacity - 1, step), capacity - 1)
+            sel = sel[trail_front[i, sel]]
+            proj_trails.append(trail_xy[i, sel])
+            trail_colors.append(color)
+
+        trail_renderer.draw(screen, proj_trails, trail_colors)
+        profiler.count("draw_calls", trail_renderer.draw_calls)
+        profiler.lap("trail_render")
+
+        # Test particles (single pixels)
+        test_xy, _, test_visible = camera.project(test_pos)
+        visualization.splat_points(screen, test_xy[test_visible], (150, 150, 160))
+        profiler.lap("particles")
     
-    pygame.display.flip()
-    clock.tick(60)
+        # 3. Bodies
+        body_xy, body_depth, in_front = camera.project(pos, margin=np.inf)
+        # Perspective-based size
+        masses = state.masses
+        vis_size = np.where(masses > 0, np.maximum(0.5, np.log10(np.where(masses > 0, masses, 1.0)) + 2), 1.0)
+        radii = np.maximum(1, (vis_size * 550 / np.where(in_front, body_depth, 1.0)).astype(np.int64))
+        # Cull bodies whose disc and label are entirely off screen
+        visible = in_front & camera.project(pos, margin=radii + LABEL_MARGIN)[2]
+        calls = visualization.draw_bodies(screen, body_xy, body_depth, visible, radii, state.colors, state.names, ui.render_label)
+        profiler.count("draw_calls", calls)
+        profiler.lap("bodies")
 
-    # 4. UI
-    selector.draw(screen)
+        # 4. UI
+        selector.draw(screen)
+        profiler.lap("ui")
+        if hud is not None:
+            hud.draw(screen, profiler)
+            profiler.lap("hud")
     
-    pygame.display.flip()
-    clock.tick(60)
+        pygame.display.flip()
+        profiler.lap("flip")
+        clock.tick(60)
+        profiler.lap("idle")
+        profiler.end_frame()
+
+    worker.stop()
+    sim.stop_recording()
+    save_system(sim)
+    if profiler.tracing:
+        print(f"Wrote {profiler.export_trace(TRACE_PATH)} trace events to {TRACE_PATH}")
+    pygame.quit()
 
-pygame.quit()
+if __name__ == "__main__":
+    main()
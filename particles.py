@@ -0,0 +1,127 @@
+import numpy as np
+from kepler import elements_to_cartesian
+
+def _index(state, body):
+    """Body index from an index, a name, or None for the most massive body."""
+    if body is None:
+        return int(np.argmax(state.masses))
+    if isinstance(body, str):
+        return state.names.index(body)
+    return int(body)
+
+def orbital_plane_basis(state, primary=None):
+    """
+    Orthonormal (e1, e2, normal) basis of the mean orbital plane around the
+    primary, taken from the total angular momentum of the other bodies.
+    Falls back to the reference XY plane when there is nothing orbiting.
+    """
+    p = _index(state, primary)
+    rel_pos = state.pos - state.pos[p]
+    rel_vel = state.vel - state.vel[p]
+    normal = np.sum(state.masses[:, np.newaxis] * np.cross(rel_pos, rel_vel), axis=0)
+    norm = np.linalg.norm(normal)
+    normal = normal / norm if norm > 0 else np.array([0.0, 0.0, 1.0])
+
+    helper = np.array([1.0, 0.0, 0.0]) if abs(normal[0]) < 0.9 else np.array([0.0, 1.0, 0.0])
+    e1 = np.cross(helper, normal)
+    e1 /= np.linalg.norm(e1)
+    e2 = np.cross(normal, e1)
+    return np.stack([e1, e2, normal])
+
+def make_belt(state, G, n, a, e=(0.0, 0.1), inc=(0.0, 0.1), primary=None, plane="orbits", seed=None):
+    """
+    Test particles on Keplerian orbits around the primary, with elements drawn
+    uniformly from the given (low, high) ranges: semi-major axis a in
+    simulator length units, eccentricity e, inclination inc in radians. Node,
+    pericentre and mean anomaly are uniform in [0, 2 pi).
+    plane: "orbits" measures inclinations from the bodies' mean orbital
+           plane, "reference" from the XY plane of the data frame
+    Returns (pos, vel) arrays of shape (n, 3) in the state's frame.
+    """
+    rng = np.random.default_rng(seed)
+    p = _index(state, primary)
+    two_pi = 2 * np.pi
+    pos, vel = elements_to_cartesian(
+        rng.uniform(*a, n),
+        rng.uniform(*e, n),
+        rng.uniform(*inc, n),
+        rng.uniform(0, two_pi, n),
+        rng.uniform(0, two_pi, n),
+        rng.uniform(0, two_pi, n),
+        G * state.masses[p],
+    )
+    if plane == "orbits":
+        basis = orbital_plane_basis(state, p)
+        pos, vel = pos @ basis, vel @ basis
+    return pos + state.pos[p], vel + state.vel[p]
+
+def make_ring(state, G, n, r_in, r_out, thickness=0.0, primary=None, seed=None):
+    """
+    Thin ring of test particles on near-circular orbits between r_in and
+    r_out, in the mean orbital plane of the primary's companions. thickness
+    is the vertical RMS scatter in simulator length units.
+    Returns (pos, vel) arrays of shape (n, 3).
+    """
+    rng = np.random.default_rng(seed)
+    # Uniform surface density: radius ~ sqrt(uniform(r_in^2, r_out^2))
+    radius = np.sqrt(rng.uniform(r_in ** 2, r_out ** 2, n))
+    inc = np.abs(rng.normal(0.0, thickness, n)) / radius
+    p = _index(state, primary)
+    pos, vel = elements_to_cartesian(
+        radius, 0.0, inc, rng.uniform(0, 2 * np.pi, n), 0.0, rng.uniform(0, 2 * np.pi, n),
+        G * state.masses[p],
+    )
+    basis = orbital_plane_basis(state, p)
+    return pos @ basis + state.pos[p], vel @ basis + state.vel[p]
+
+def make_trojans(state, G, n, planet, spread=0.1, primary=None, seed=None):
+    """
+    Test particles librating around a planet's L4 and L5 points: the planet's
+    position and velocity relative to the primary, rotated by +/-60 degrees
+    about its orbit normal, with Gaussian scatter of spread radians in
+    longitude and spread / 10 in relative radius.
+    Returns (pos, vel) arrays of shape (n, 3).
+    """
+    rng = np.random.default_rng(seed)
+    p, k = _index(state, primary), _index(state, planet)
+    r = state.pos[k] - state.pos[p]
+    v = state.vel[k] - state.vel[p]
+    axis = np.cross(r, v)
+    axis /= np.linalg.norm(axis)
+
+    angle = np.where(rng.random(n) < 0.5, np.pi / 3, -np.pi / 3) + rng.normal(0.0, spread, n)
+    scale = 1 + rng.normal(0.0, spread / 10, n)
+
+    def rotate(vec):
+        # Rodrigues' rotation of vec about axis by every angle at once
+        cos, sin = np.cos(angle)[:, np.newaxis], np.sin(angle)[:, np.newaxis]
+        return vec * cos + np.cross(axis, vec) * sin + axis * (axis @ vec) * (1 - cos)
+
+    pos = rotate(r) * scale[:, np.newaxis]
+    vel = rotate(v) / np.sqrt(scale)[:, np.newaxis]
+    return pos + state.pos[p], vel + state.vel[p]
+
+GENERATORS = {
+    "belt": make_belt,
+    "ring": make_ring,
+    "trojans": make_trojans,
+}
+
+def seed_populations(state, G, length_scale, populations, count):
+    """
+    Adds test-particle populations described in data.POPULATIONS format to
+    state. Distances in the description are in km and converted with
+    length_scale (simulator units per km); count particles are shared
+    between the populations in proportion to their "weight".
+    """
+    total_weight = sum(spec.get("weight", 1.0) for _, spec in populations)
+    for kind, spec in populations:
+        spec = dict(spec)
+        n = int(count * spec.pop("weight", 1.0) / total_weight)
+        for key in ("a", "r_in", "r_out", "thickness"):
+            if key in spec:
+                spec[key] = np.multiply(spec[key], length_scale)
+        if "a" in spec:
+            spec["a"] = tuple(spec["a"])
+        state.add_test_particles(*GENERATORS[kind](state, G, n, **spec))
+    return state
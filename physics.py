@@ -1,63 +1,666 @@
 import numpy as np
+from kepler import kepler_drift
+from trails import TrailBuffer
 
-def get_acceleration(pos, masses, G):
+# Softening added to r^3 so coincident bodies never divide by zero
+SOFTENING = 1e-10
+
+# Above this many bodies the kernel switches to tiled evaluation, which
+# visits each pair of tiles once and never materializes the (N, N, 3)
+# difference tensor in one piece. Measured on the direct block versus
+# tiles: equal up to 128 bodies, tiles of 128 about 1.8x faster at 1024.
+DIRECT_MAX_BODIES = 128
+DEFAULT_TILE_SIZE = 128
+# Pairs per block for kernels that tile over targets only
+TILE_PAIRS = 512 ** 2
+# With at most this many sources, get_acceleration_on loops over the sources
+# and vectorizes over the targets, which keeps memory at O(targets).
+SOURCE_LOOP_MAX = 64
+# Targets per pass of that loop; small enough for the work arrays to stay in
+# cache (about 2x faster than whole-array passes at 1e6 targets)
+TARGET_CHUNK = 1 << 15
+
+def _pair_block(pos_i, pos_j):
+    """
+    Pairwise separation vectors and 1/|r|^3 weights between two groups.
+    Returns diff (Bi, Bj, 3) with diff[a, b] = pos_j[b] - pos_i[a] and
+    inv_r3 (Bi, Bj).
+    """
+    diff = pos_j[np.newaxis, :, :] - pos_i[:, np.newaxis, :]
+    dist_sq = np.einsum('ijk,ijk->ij', diff, diff)
+    inv_r3 = 1.0 / (dist_sq * np.sqrt(dist_sq) + SOFTENING)
+    return diff, inv_r3
+
+def get_acceleration(pos, masses, G, tile_size=None, dtype=np.float64):
     """
     Vectorized acceleration calculation.
     pos: (N, 3) array of positions
     masses: (N,) array of masses
+    tile_size: bodies per tile; None picks direct broadcast for small N and
+               DEFAULT_TILE_SIZE tiles above DIRECT_MAX_BODIES
+    dtype: np.float64 (default) or np.float32 for the fast, lower-precision path
+
+    Pairs in different tiles are evaluated once: the weight matrix for a
+    block of pairs is applied to both bodies of the pair with opposite signs
+    (Newton's third law), so the tiled path only visits the upper triangle
+    of tile pairs. Pairs within one tile, and so every pair of the direct
+    path, are evaluated from both sides; at that size the full block is
+    faster than gathering its upper triangle.
     """
+    pos = np.asarray(pos, dtype=dtype)
+    masses = np.asarray(masses, dtype=dtype)
     num_bodies = len(masses)
-    acceleration = np.zeros((num_bodies, 3))
-    
-    for i in range(num_bodies):
-        diff = pos - pos[i]
-        dist_sq = np.sum(diff**2, axis=1)
-        
-        # Avoid division by zero for the body itself
-        dist_sq[i] = np.inf
-        
-        # Acceleration: a = G * m_k * r_ik / |r_ik|^3
-        dist = np.sqrt(dist_sq)
-        # Use a small epsilon to avoid singularities
-        mag = G * masses / (dist_sq * dist + 1e-10) 
-        
-        acceleration[i] = np.sum(diff * mag[:, np.newaxis], axis=0)
-        
+
+    if tile_size is None:
+        tile_size = num_bodies if num_bodies <= DIRECT_MAX_BODIES else DEFAULT_TILE_SIZE
+    tile_size = max(1, int(tile_size))
+
+    # Acceleration: a_i = G * sum_k m_k * r_ik / |r_ik|^3
+    # The self term has r_ii = 0, so it contributes nothing.
+    if num_bodies <= tile_size:
+        diff, inv_r3 = _pair_block(pos, pos)
+        return G * np.einsum('ij,ijk->ik', inv_r3 * masses[np.newaxis, :], diff)
+
+    acceleration = np.zeros((num_bodies, 3), dtype=dtype)
+    starts = range(0, num_bodies, tile_size)
+    for i0 in starts:
+        i1 = min(i0 + tile_size, num_bodies)
+        for j0 in range(i0, num_bodies, tile_size):
+            j1 = min(j0 + tile_size, num_bodies)
+            diff, inv_r3 = _pair_block(pos[i0:i1], pos[j0:j1])
+
+            # Pull of tile j on tile i
+            acceleration[i0:i1] += G * np.einsum('ij,ijk->ik', inv_r3 * masses[np.newaxis, j0:j1], diff)
+            if j0 != i0:
+                # Equal and opposite pull of tile i on tile j
+                acceleration[j0:j1] -= G * np.einsum('ij,ijk->jk', inv_r3 * masses[i0:i1, np.newaxis], diff)
+
     return acceleration
 
-def rk4_step(data, dt, G):
+def get_acceleration_on(targets, pos, masses, G):
     """
-    4th Order Runge-Kutta Integrator.
-    data: list of [mass, [x, vx], [y, vy], [z, vz], trail, name, color]
+    Acceleration at arbitrary target points due to the bodies at pos.
+    targets: (M, 3) array of positions
+    pos: (N, 3) array of source positions, masses: (N,) array
+    Few sources (the massive bodies pulling on test particles) are looped
+    over with TARGET_CHUNK targets at a time; otherwise targets are processed
+    in tiles of at most TILE_PAIRS pairs. A target sitting exactly on a
+    source gets no force from it, so passing a subset of pos as targets
+    yields those bodies' accelerations.
     """
-    masses = np.array([p[0] for p in data])
-    pos = np.array([[p[1][0], p[2][0], p[3][0]] for p in data])
-    vel = np.array([[p[1][1], p[2][1], p[3][1]] for p in data])
-    
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+    pos = np.asarray(pos, dtype=np.float64)
+    masses = np.asarray(masses, dtype=np.float64)
+    acceleration = np.zeros((len(targets), 3))
+    if len(masses) == 0 or len(targets) == 0:
+        return acceleration
+
+    if len(masses) <= SOURCE_LOOP_MAX:
+        # Coordinate-major work arrays and in-place ufuncs keep every pass
+        # over the targets contiguous and allocation-free
+        coords = np.ascontiguousarray(targets.T)
+        chunk = min(TARGET_CHUNK, len(targets))
+        acc = np.empty((3, chunk))
+        diff = np.empty((3, chunk))
+        dist_sq = np.empty(chunk)
+        tmp = np.empty(chunk)
+        for c0 in range(0, len(targets), chunk):
+            k = min(chunk, len(targets) - c0)
+            block, a, d, r2, t = coords[:, c0:c0 + k], acc[:, :k], diff[:, :k], dist_sq[:k], tmp[:k]
+            a.fill(0.0)
+            for source, mass in zip(pos, masses):
+                np.subtract(source[:, np.newaxis], block, out=d)
+                np.multiply(d[0], d[0], out=r2)
+                for j in (1, 2):
+                    np.multiply(d[j], d[j], out=t)
+                    r2 += t
+                # t = G m / (r^3 + softening)
+                np.sqrt(r2, out=t)
+                t *= r2
+                t += SOFTENING
+                np.divide(G * mass, t, out=t)
+                d *= t
+                a += d
+            acceleration[c0:c0 + k] = a.T
+        return acceleration
+
+    tile = max(1, TILE_PAIRS // len(masses))
+    for t0 in range(0, len(targets), tile):
+        diff, inv_r3 = _pair_block(targets[t0:t0 + tile], pos)
+        acceleration[t0:t0 + tile] = G * np.einsum('ij,ijk->ik', inv_r3 * masses[np.newaxis, :], diff)
+    return acceleration
+
+def counting(accel):
+    """Wraps an acceleration function so that its calls are counted in .calls."""
+
+    def counted(pos, masses, G):
+        counted.calls += 1
+        return accel(pos, masses, G)
+
+    counted.calls = 0
+    return counted
+
+class SimState:
+    """
+    Structure-of-arrays simulation state.
+    masses: (N,) array, pos/vel: contiguous (N, 3) arrays
+    names, colors: per-body metadata kept outside the numeric arrays
+    trails: TrailBuffer holding the recent positions of every body
+    test_pos/test_vel: (M, 3) arrays of massless test particles, which feel
+    the bodies' gravity but exert none
+    revision: bumped by every integrator step and every change made through
+    SimState or BodyView; code that writes pos, test_pos or masses directly
+    calls touch() so that cached accelerations are not reused
+    Iterating or indexing yields BodyView objects that mimic the legacy
+    [mass, [x, vx], [y, vy], [z, vz], trail, name, color] lists.
+    """
+
+    def __init__(self, masses, pos, vel, names=None, colors=None):
+        self.masses = np.ascontiguousarray(masses, dtype=np.float64)
+        self.pos = np.ascontiguousarray(pos, dtype=np.float64).reshape(-1, 3)
+        self.vel = np.ascontiguousarray(vel, dtype=np.float64).reshape(-1, 3)
+        n = len(self.masses)
+        self.names = list(names) if names is not None else [str(i) for i in range(n)]
+        self.colors = list(colors) if colors is not None else [(255, 255, 255)] * n
+        self.trails = TrailBuffer(n)
+        self.test_pos = np.zeros((0, 3))
+        self.test_vel = np.zeros((0, 3))
+        self.revision = 0
+        # (revision, G, key, (acc, test_acc)) from the last symplectic step
+        self.acc_cache = None
+
+    def __len__(self):
+        return len(self.masses)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return BodyView(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield BodyView(self, i)
+
+    @classmethod
+    def from_list(cls, data):
+        """Builds a state from the legacy list-of-lists format."""
+        state = cls(
+            [p[0] for p in data],
+            [[p[1][0], p[2][0], p[3][0]] for p in data],
+            [[p[1][1], p[2][1], p[3][1]] for p in data],
+            [p[5] for p in data],
+            [p[6] for p in data],
+        )
+        for i, p in enumerate(data):
+            state.trails[i] = p[4]
+        return state
+
+    def to_list(self):
+        """Returns a detached copy in the legacy list-of-lists format."""
+        bodies = [list(body) for body in self]
+        for body in bodies:
+            body[4] = body[4].tolist()
+        return bodies
+
+    @property
+    def n_test(self):
+        return len(self.test_pos)
+
+    def touch(self):
+        """Marks the positions or masses as changed."""
+        self.revision += 1
+
+    def add_test_particles(self, pos, vel):
+        """Appends massless test particles, given as (M, 3) position and velocity arrays."""
+        self.test_pos = np.ascontiguousarray(np.concatenate([self.test_pos, np.reshape(pos, (-1, 3))]))
+        self.test_vel = np.ascontiguousarray(np.concatenate([self.test_vel, np.reshape(vel, (-1, 3))]))
+        self.touch()
+
+    def clear_test_particles(self):
+        self.test_pos = np.zeros((0, 3))
+        self.test_vel = np.zeros((0, 3))
+        self.touch()
+
+    def copy(self):
+        state = SimState(self.masses.copy(), self.pos.copy(), self.vel.copy(), self.names, self.colors)
+        state.trails = self.trails.copy()
+        state.test_pos, state.test_vel = self.test_pos.copy(), self.test_vel.copy()
+        return state
+
+class BodyView:
+    """Legacy list-style view of one body of a SimState; writes go to the arrays."""
+
+    def __init__(self, state, index):
+        self._state = state
+        self._index = index
+
+    def __len__(self):
+        return 7
+
+    def __iter__(self):
+        for k in range(7):
+            yield self[k]
+
+    def __getitem__(self, k):
+        s, i = self._state, self._index
+        if k == 0: return float(s.masses[i])
+        if 1 <= k <= 3: return [float(s.pos[i, k - 1]), float(s.vel[i, k - 1])]
+        if k == 4: return s.trails[i]
+        if k == 5: return s.names[i]
+        if k == 6: return s.colors[i]
+        raise IndexError(k)
+
+    def __setitem__(self, k, value):
+        s, i = self._state, self._index
+        if k == 0: s.masses[i] = value
+        elif 1 <= k <= 3: s.pos[i, k - 1], s.vel[i, k - 1] = value
+        elif k == 4: s.trails[i] = value
+        elif k == 5: s.names[i] = value
+        elif k == 6: s.colors[i] = value
+        else: raise IndexError(k)
+        if k <= 3:
+            s.touch()
+
+    def __repr__(self):
+        return repr(list(self))
+
+def _rk4_parts(pos, vel, dt, acc):
+    """
+    One RK4 step of a system split into parts (tuples of arrays, e.g. bodies
+    and test particles); acc(pos) returns the accelerations of every part.
+    Returns (new_pos, new_vel) as tuples.
+    """
+    def shifted(x, k, h):
+        return tuple(xi + ki * h for xi, ki in zip(x, k))
+
     # k1
-    a1 = get_acceleration(pos, masses, G)
+    a1 = acc(pos)
     v1 = vel
-    
+
     # k2
-    a2 = get_acceleration(pos + v1 * dt/2, masses, G)
-    v2 = vel + a1 * dt/2
-    
+    a2 = acc(shifted(pos, v1, dt/2))
+    v2 = shifted(vel, a1, dt/2)
+
     # k3
-    a3 = get_acceleration(pos + v2 * dt/2, masses, G)
-    v3 = vel + a2 * dt/2
-    
+    a3 = acc(shifted(pos, v2, dt/2))
+    v3 = shifted(vel, a2, dt/2)
+
     # k4
-    a4 = get_acceleration(pos + v3 * dt, masses, G)
-    v4 = vel + a3 * dt
-    
+    a4 = acc(shifted(pos, v3, dt))
+    v4 = shifted(vel, a3, dt)
+
     # Combine (weighted average)
-    new_pos = pos + (dt/6) * (v1 + 2*v2 + 2*v3 + v4)
-    new_vel = vel + (dt/6) * (a1 + 2*a2 + 2*a3 + a4)
-    
-    # Update data structure
-    for i in range(len(data)):
-        data[i][1] = [float(new_pos[i, 0]), float(new_vel[i, 0])]
-        data[i][2] = [float(new_pos[i, 1]), float(new_vel[i, 1])]
-        data[i][3] = [float(new_pos[i, 2]), float(new_vel[i, 2])]
-        
-    return data
+    new_pos = tuple(x + (dt/6) * (k1 + 2*k2 + 2*k3 + k4) for x, k1, k2, k3, k4 in zip(pos, v1, v2, v3, v4))
+    new_vel = tuple(v + (dt/6) * (k1 + 2*k2 + 2*k3 + k4) for v, k1, k2, k3, k4 in zip(vel, a1, a2, a3, a4))
+    return new_pos, new_vel
+
+def rk4_arrays(pos, vel, masses, dt, G, accel):
+    """
+    One RK4 step on raw arrays, for callers that keep their own arrays
+    instead of a SimState (e.g. ensemble.Ensemble); returns (new_pos, new_vel).
+    """
+    (new_pos,), (new_vel,) = _rk4_parts((pos,), (vel,), dt, lambda p: (accel(p[0], masses, G),))
+    return new_pos, new_vel
+
+def _body_and_test_acceleration(masses, G, accel):
+    """acc((pos, test_pos)) -> (acc, test_acc): test particles only feel the bodies."""
+
+    def acc(parts):
+        pos, test_pos = parts
+        return accel(pos, masses, G), get_acceleration_on(test_pos, pos, masses, G)
+
+    return acc
+
+def _with_test_particles(n, accel):
+    """
+    Acceleration function over the stacked [bodies; test particles] arrays:
+    the first n rows interact through accel, the rest only feel the first n.
+    """
+
+    def stacked(pos, masses, G):
+        acc = np.empty_like(pos)
+        acc[:n] = accel(pos[:n], masses, G)
+        acc[n:] = get_acceleration_on(pos[n:], pos[:n], masses, G)
+        return acc
+
+    return stacked
+
+def _stacked(state, accel):
+    """(pos, vel, accel) covering bodies and test particles alike, for DormandPrince's error control."""
+    if not state.n_test:
+        return state.pos, state.vel, accel
+    pos = np.concatenate([state.pos, state.test_pos])
+    vel = np.concatenate([state.vel, state.test_vel])
+    return pos, vel, _with_test_particles(len(state.masses), accel)
+
+def _unstack(state, pos, vel):
+    n = len(state.masses)
+    state.pos[:], state.vel[:] = pos[:n], vel[:n]
+    if state.n_test:
+        state.test_pos[:], state.test_vel[:] = pos[n:], vel[n:]
+
+def rk4_step(state, dt, G, accel=get_acceleration):
+    """
+    4th Order Runge-Kutta Integrator.
+    state: SimState, advanced in place. A legacy list of
+           [mass, [x, vx], [y, vy], [z, vz], trail, name, color] is still
+           accepted and updated in place, at the cost of a conversion.
+    accel: acceleration function (pos, masses, G) -> (N, 3), e.g. the
+           Barnes-Hut engine from barnes_hut.get_acceleration_func
+    """
+    if not isinstance(state, SimState):
+        sim = SimState.from_list(state)
+        rk4_step(sim, dt, G, accel)
+        for i, body in enumerate(sim):
+            state[i][1], state[i][2], state[i][3] = body[1], body[2], body[3]
+        return state
+
+    if not state.n_test:
+        state.pos[:], state.vel[:] = rk4_arrays(state.pos, state.vel, state.masses, dt, G, accel)
+    else:
+        # Test particles keep their own arrays; they only feel the bodies
+        (pos, test_pos), (vel, test_vel) = _rk4_parts(
+            (state.pos, state.test_pos), (state.vel, state.test_vel), dt,
+            _body_and_test_acceleration(state.masses, G, accel))
+        state.pos[:], state.vel[:] = pos, vel
+        state.test_pos, state.test_vel = test_pos, test_vel
+    state.touch()
+    return state
+
+# Dormand-Prince 5(4) tableau
+_DP_C = (0.0, 1/5, 3/10, 4/5, 8/9, 1.0, 1.0)
+_DP_A = (
+    (),
+    (1/5,),
+    (3/40, 9/40),
+    (44/45, -56/15, 32/9),
+    (19372/6561, -25360/2187, 64448/6561, -212/729),
+    (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+    (35/384, 0.0, 500/1113, 125/192, -2187/6784, 11/84),
+)
+# 5th order weights equal the last row of A (first-same-as-last); these are
+# the differences between the 5th and embedded 4th order weights.
+_DP_E = (71/57600, 0.0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+
+class DormandPrince:
+    """
+    Adaptive embedded Runge-Kutta integrator (Dormand-Prince 5(4)).
+    advance(state, t_span, G) moves a SimState forward by t_span simulated
+    time, choosing its own substeps from the rtol/atol error estimate. The
+    last stage of an accepted step is reused as the first stage of the next
+    one (FSAL), so an accepted step costs six force evaluations.
+    n_evals, n_accepted and n_rejected accumulate over the object's lifetime.
+    """
+
+    def __init__(self, rtol=1e-8, atol=1e-10, accel=get_acceleration, h=None,
+                 safety=0.9, min_factor=0.2, max_factor=5.0, max_steps=100000):
+        self.rtol = rtol
+        self.atol = atol
+        self.accel = accel
+        self.h = h
+        self.safety = safety
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.max_steps = max_steps
+        self.n_evals = 0
+        self.n_accepted = 0
+        self.n_rejected = 0
+        self._fsal = None
+
+    def __call__(self, state, dt, G):
+        return self.advance(state, dt, G)
+
+    def _acc(self, accel, pos, masses, G):
+        self.n_evals += 1
+        return accel(pos, masses, G)
+
+    def _initial_acc(self, accel, pos, vel, masses, G):
+        # Reuse the stored last stage only if the state was not touched since
+        if self._fsal is not None:
+            f_pos, f_vel, f_masses, f_G, f_acc = self._fsal
+            if f_G == G and np.array_equal(f_pos, pos) and np.array_equal(f_vel, vel) and np.array_equal(f_masses, masses):
+                return f_acc
+        return self._acc(accel, pos, masses, G)
+
+    def _error_scale(self, a, b):
+        return self.atol + self.rtol * np.maximum(np.abs(a), np.abs(b))
+
+    def _initial_step(self, pos, vel, acc, t_span):
+        scale_y = self._error_scale(np.concatenate([pos, vel]), 0)
+        d0 = np.sqrt(np.mean((np.concatenate([pos, vel]) / scale_y) ** 2))
+        d1 = np.sqrt(np.mean((np.concatenate([vel, acc]) / scale_y) ** 2))
+        h = 0.01 * d0 / d1 if d0 > 1e-5 and d1 > 1e-5 else 1e-6
+        return min(h, abs(t_span))
+
+    def advance(self, state, t_span, G):
+        """Advances state (in place) by t_span; returns the state."""
+        masses = state.masses
+        if t_span == 0 or len(masses) == 0:
+            return state
+
+        # Test particles join the error-controlled system as massless rows
+        pos, vel, accel = _stacked(state, self.accel)
+        acc = self._initial_acc(accel, pos, vel, masses, G)
+        h = self.h if self.h else self._initial_step(pos, vel, acc, t_span)
+        t, direction = 0.0, np.sign(t_span)
+        h = abs(h) * direction
+
+        for _ in range(self.max_steps):
+            remaining = t_span - t
+            if remaining * direction <= 0:
+                break
+            clipped = abs(h) >= abs(remaining)
+            step = remaining if clipped else h
+
+            # Stages: kx are velocities, kv are accelerations
+            kx, kv = [vel], [acc]
+            for i in range(1, 7):
+                row = _DP_A[i]
+                p = pos + step * sum(a * k for a, k in zip(row, kx) if a)
+                v = vel + step * sum(a * k for a, k in zip(row, kv) if a)
+                kx.append(v)
+                kv.append(self._acc(accel, p, masses, G))
+            new_pos, new_vel, new_acc = p, v, kv[-1]
+
+            err_pos = step * sum(e * k for e, k in zip(_DP_E, kx) if e)
+            err_vel = step * sum(e * k for e, k in zip(_DP_E, kv) if e)
+            scale = self._error_scale(np.concatenate([pos, vel]), np.concatenate([new_pos, new_vel]))
+            err = np.sqrt(np.mean((np.concatenate([err_pos, err_vel]) / scale) ** 2))
+
+            if err <= 1.0:
+                t += step
+                pos, vel, acc = new_pos, new_vel, new_acc
+                self.n_accepted += 1
+                factor = self.max_factor if err == 0 else min(self.max_factor, max(self.min_factor, self.safety * err ** -0.2))
+                # A step shortened to land on t_span says nothing about the natural step size
+                if not clipped or factor < 1:
+                    h = step * factor
+            else:
+                self.n_rejected += 1
+                h = step * max(self.min_factor, self.safety * err ** -0.2)
+        else:
+            raise RuntimeError(f"DormandPrince exceeded {self.max_steps} steps advancing by {t_span}")
+
+        _unstack(state, pos, vel)
+        state.touch()
+        self.h = abs(h)
+        self._fsal = (pos.copy(), vel.copy(), masses.copy(), G, acc)
+        return state
+
+# --- Symplectic integrators ---
+
+# Yoshida (1990) composition weights for the kick-drift-kick leapfrog
+_CBRT2 = 2 ** (1 / 3)
+_YOSHIDA4 = (1 / (2 - _CBRT2), -_CBRT2 / (2 - _CBRT2), 1 / (2 - _CBRT2))
+_Y6 = (0.784513610477560, 0.235573213359357, -1.17767998417887)
+_YOSHIDA6 = _Y6 + (1 - 2 * sum(_Y6),) + _Y6[::-1]
+
+def _cache_lookup(state, G, key):
+    """
+    (acc, test_acc) stored by the previous step under key, if the state has
+    not changed since (a step's final kick force is the next step's first
+    kick force). Returns None on a miss.
+    """
+    cache = state.acc_cache
+    if cache is not None:
+        c_revision, c_G, c_key, c_acc = cache
+        if c_revision == state.revision and c_G == G and c_key == key:
+            return c_acc
+    return None
+
+def _cache_store(state, G, key, acc):
+    """Bumps the state's revision for the finished step and caches its final force."""
+    state.touch()
+    state.acc_cache = (state.revision, G, key, acc)
+
+def _kdk_composition(state, dt, G, accel, weights):
+    """Runs one kick-drift-kick leapfrog substep of w * dt for each weight w."""
+    key, masses = accel, state.masses
+    pos, vel = state.pos, state.vel
+    # Test particles are advanced in place in their own arrays
+    test_pos, test_vel = state.test_pos, state.test_vel
+    acc = _cache_lookup(state, G, key)
+    if acc is None:
+        acc = (accel(pos, masses, G), get_acceleration_on(test_pos, pos, masses, G))
+    for w in weights:
+        h = w * dt
+        vel = vel + (h / 2) * acc[0]
+        pos = pos + h * vel
+        test_vel += (h / 2) * acc[1]
+        test_pos += h * test_vel
+        acc = (accel(pos, masses, G), get_acceleration_on(test_pos, pos, masses, G))
+        vel = vel + (h / 2) * acc[0]
+        test_vel += (h / 2) * acc[1]
+
+    state.pos[:], state.vel[:] = pos, vel
+    _cache_store(state, G, key, acc)
+    return state
+
+def leapfrog_step(state, dt, G, accel=get_acceleration):
+    """Kick-drift-kick leapfrog: 2nd order, one force evaluation per step."""
+    return _kdk_composition(state, dt, G, accel, (1.0,))
+
+def yoshida4_step(state, dt, G, accel=get_acceleration):
+    """Yoshida 4th order symplectic step: three leapfrog substeps."""
+    return _kdk_composition(state, dt, G, accel, _YOSHIDA4)
+
+def yoshida6_step(state, dt, G, accel=get_acceleration):
+    """Yoshida 6th order symplectic step (solution A): seven leapfrog substeps."""
+    return _kdk_composition(state, dt, G, accel, _YOSHIDA6)
+
+def wisdom_holman_step(state, dt, G, accel=get_acceleration):
+    """
+    Wisdom-Holman mixed-variable symplectic step in democratic heliocentric
+    coordinates (Duncan, Levison & Lee 1998). Keplerian motion about the most
+    massive body is propagated analytically by kepler.kepler_drift; only the
+    mutual perturbations between the other bodies go through accel.
+    """
+    masses = state.masses
+    primary = int(np.argmax(masses))
+    others = np.arange(len(masses)) != primary
+    m0, m = masses[primary], masses[others]
+    total_mass = masses.sum()
+
+    # Heliocentric positions, barycentric velocities
+    com = masses @ state.pos / total_mass
+    com_vel = masses @ state.vel / total_mass
+    Q = state.pos[others] - state.pos[primary]
+    U = state.vel[others] - com_vel
+    # Test particles get the same treatment in their own arrays; they feel
+    # the other bodies but not each other
+    test_Q = state.test_pos - state.pos[primary]
+    test_U = state.test_vel - com_vel
+
+    key = ("wisdom_holman", accel)
+    acc = _cache_lookup(state, G, key)
+    if acc is None:
+        acc = (accel(Q, m, G), get_acceleration_on(test_Q, Q, m, G))
+
+    # Interaction kick, primary-momentum drift, Kepler drift, and back
+    U = U + (dt / 2) * acc[0]
+    test_U += (dt / 2) * acc[1]
+    shift = (dt / 2) * (m @ U) / m0
+    Q = Q + shift
+    test_Q += shift
+    Q, U = kepler_drift(Q, U, G * m0, dt)
+    if len(test_Q):
+        test_Q, test_U = kepler_drift(test_Q, test_U, G * m0, dt)
+    shift = (dt / 2) * (m @ U) / m0
+    Q = Q + shift
+    test_Q += shift
+    acc = (accel(Q, m, G), get_acceleration_on(test_Q, Q, m, G))
+    U = U + (dt / 2) * acc[0]
+    test_U += (dt / 2) * acc[1]
+
+    # Back to the original frame: the barycentre moves uniformly
+    primary_pos = com + com_vel * dt - (m @ Q) / total_mass
+    state.pos[primary] = primary_pos
+    state.pos[others] = primary_pos + Q
+    state.vel[primary] = com_vel - (m @ U) / m0
+    state.vel[others] = com_vel + U
+    np.add(test_Q, primary_pos, out=state.test_pos)
+    np.add(test_U, com_vel, out=state.test_vel)
+
+    _cache_store(state, G, key, acc)
+    return state
+
+# --- Integrator selection ---
+
+# Fixed-step engines: step(state, dt, G, accel)
+INTEGRATORS = {
+    "rk4": rk4_step,
+    "leapfrog": leapfrog_step,
+    "yoshida4": yoshida4_step,
+    "yoshida6": yoshida6_step,
+    "wisdom_holman": wisdom_holman_step,
+}
+# Stateful engines, constructed with accel and options
+ADAPTIVE_INTEGRATORS = {
+    "dopri5": DormandPrince,
+}
+# Force evaluations per step of each fixed-step engine
+EVALS_PER_STEP = {"rk4": 4, "leapfrog": 1, "yoshida4": 3, "yoshida6": 7, "wisdom_holman": 1}
+
+def integrator_names():
+    return list(INTEGRATORS) + list(ADAPTIVE_INTEGRATORS)
+
+def get_integrator(name, accel=get_acceleration, **options):
+    """Returns a step function step(state, dt, G) for the named integrator."""
+    if name in ADAPTIVE_INTEGRATORS:
+        return ADAPTIVE_INTEGRATORS[name](accel=accel, **options)
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator: {name}")
+    step = INTEGRATORS[name]
+
+    def step_func(state, dt, G):
+        return step(state, dt, G, accel)
+
+    return step_func
+
+def integrate(state, dt, n_steps, sample_every, G, accel=get_acceleration, method="rk4"):
+    """
+    Advances state by n_steps steps inside a single call.
+    method: integrator name (see integrator_names()) or a step function
+            returned by get_integrator, which keeps adaptive engines' state
+    Every sample_every steps the positions are copied into a preallocated
+    (n_steps // sample_every, N, 3) block, returned as (state, samples) and
+    intended for trails. state is updated in place.
+    """
+    step = get_integrator(method, accel) if isinstance(method, str) else method
+    sample_every = max(1, int(sample_every))
+    samples = np.empty((n_steps // sample_every, len(state), 3))
+
+    for i in range(1, n_steps + 1):
+        step(state, dt, G)
+        if i % sample_every == 0:
+            samples[i // sample_every - 1] = state.pos
+
+    return state, samples
+
+def total_energy(state, G):
+    """Total kinetic plus potential energy of the state."""
+    kinetic = 0.5 * np.sum(state.masses * np.einsum('ij,ij->i', state.vel, state.vel))
+    i, j = np.triu_indices(len(state), k=1)
+    dist = np.linalg.norm(state.pos[i] - state.pos[j], axis=1)
+    potential = -G * np.sum(state.masses[i] * state.masses[j] / dist)
+    return kinetic + potential
@@ -0,0 +1,198 @@
+"""
+Per-frame phase profiler for the viewer:
+
+    with profiler.phase("trails"):
+        ...
+    profiler.lap("bodies")  # time since the previous lap or frame end
+    profiler.count("draw_calls", n)
+    profiler.end_frame()
+
+While disabled, phase() hands back a shared no-op context manager and
+lap() and count() return at once, so the instrumentation can stay in the hot paths.
+Enabled, every phase's time per frame goes into a rolling window for
+percentiles, and with tracing on each phase is also logged as a Chrome
+trace event (chrome://tracing, Perfetto) for export_trace().
+GRAVITY_PROFILE=1 enables the shared profiler at startup.
+"""
+import collections
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# Frames kept for the rolling percentiles
+WINDOW = 240
+PERCENTILES = (50, 95, 99)
+# Trace events kept for export; older events are dropped first
+MAX_TRACE_EVENTS = 500000
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_time(self.name, self.start, time.perf_counter())
+        return False
+
+class Profiler:
+    """
+    Accumulates phase times (ms) and counters per frame. Phases may run on
+    any thread, e.g. the physics worker's ticks; they count towards the
+    frame that is open when they finish. Laps split a single thread's
+    loop into consecutive phases without wrapping each in a with block.
+    end_frame() closes a frame and also records its wall time as the
+    "frame" phase.
+    """
+
+    def __init__(self, window=WINDOW, max_events=MAX_TRACE_EVENTS):
+        self.enabled = False
+        self.tracing = False
+        self.window = window
+        self.frames = 0
+        # Per-frame history of each phase (ms) and counter
+        self.times = {}
+        self.counts = {}
+        self.trace = collections.deque(maxlen=max_events)
+        self._frame_times = collections.defaultdict(float)
+        self._frame_counts = collections.Counter()
+        self._frame_start = None
+        self._lap_start = None
+        self._threads = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def set_enabled(self, enabled=True):
+        """Turns collection on or off; turning it on starts from an empty window."""
+        with self._lock:
+            if enabled and not self.enabled:
+                self.times, self.counts = {}, {}
+                self._frame_times.clear()
+                self._frame_counts.clear()
+                self._frame_start = self._lap_start = None
+                self.frames = 0
+            self.enabled = enabled
+            if not enabled:
+                self.tracing = False
+
+    def phase(self, name):
+        """Context manager timing one phase of the current frame."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def add_time(self, name, start, end):
+        """Adds the perf_counter interval start..end to phase name."""
+        with self._lock:
+            self._frame_times[name] += (end - start) * 1000
+            if self.tracing:
+                thread = threading.current_thread()
+                self._threads[thread.ident] = thread.name
+                self.trace.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": thread.ident,
+                                   "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6})
+
+    def lap(self, name):
+        """Times phase name from the previous lap (or end_frame) until now."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._lap_start is not None:
+            self.add_time(name, self._lap_start, now)
+        self._lap_start = now
+
+    def count(self, name, n=1):
+        """Adds n to counter name for the current frame."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._frame_counts[name] += n
+
+    def end_frame(self):
+        """Closes the current frame and pushes its totals into the rolling window."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            frame_times, frame_counts = self._frame_times, self._frame_counts
+            self._frame_times, self._frame_counts = collections.defaultdict(float), collections.Counter()
+            if self._frame_start is not None:
+                frame_times["frame"] = (now - self._frame_start) * 1000
+            self._frame_start = self._lap_start = now
+            # Phases or counters absent from this frame record a zero
+            for history, values in ((self.times, frame_times), (self.counts, frame_counts)):
+                for name in values.keys() - history.keys():
+                    history[name] = collections.deque(maxlen=self.window)
+                for name, series in history.items():
+                    series.append(values.get(name, 0))
+            if self.tracing and frame_counts:
+                self.trace.append({"name": "counters", "ph": "C", "pid": os.getpid(),
+                                   "ts": (now - self._origin) * 1e6, "args": dict(frame_counts)})
+            self.frames += 1
+
+    def percentiles(self, name, q=PERCENTILES):
+        """Percentiles q of phase name over the window, in ms (zeros if never timed)."""
+        values = self.times.get(name)
+        if not values:
+            return [0.0] * len(q)
+        return np.percentile(np.fromiter(values, float, len(values)), q).tolist()
+
+    def mean_count(self, name):
+        """Mean of counter name per frame over the window."""
+        values = self.counts.get(name)
+        return sum(values) / len(values) if values else 0.0
+
+    def summary(self, q=PERCENTILES):
+        """(name, percentiles) of every phase, slowest median first, and {counter: mean per frame}."""
+        with self._lock:
+            names = list(self.times)
+            counters = {name: self.mean_count(name) for name in self.counts}
+            phases = [(name, self.percentiles(name, q)) for name in names]
+        phases.sort(key=lambda row: (row[0] != "frame", -row[1][0]))
+        return phases, counters
+
+    def start_trace(self):
+        """Enables the profiler and starts logging trace events from an empty buffer."""
+        self.set_enabled(True)
+        with self._lock:
+            self.trace.clear()
+            self.tracing = True
+
+    def stop_trace(self):
+        with self._lock:
+            self.tracing = False
+
+    def export_trace(self, path):
+        """Writes the logged events as Chrome trace-event JSON; returns the number of events."""
+        with self._lock:
+            events = list(self.trace)
+            threads = dict(self._threads)
+        pid = os.getpid()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                    for tid, name in threads.items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+# Shared profiler used by main.py and the physics worker
+profiler = Profiler()
+if os.environ.get("GRAVITY_PROFILE", "") not in ("", "0"):
+    profiler.set_enabled(True)
@@ -0,0 +1,162 @@
+import json
+import os
+import struct
+import numpy as np
+import cache
+from physics import SimState
+
+# File layout: a fixed preamble (magic, header length, frame count), a JSON
+# header padded to HEADER_ALIGN bytes, then one fixed-size record per frame
+MAGIC = b"GRVTRJ01"
+_PREAMBLE = struct.Struct("<8sIIQ")  # magic, header length, reserved, frame count
+HEADER_ALIGN = 64
+# Frames mapped at a time while writing; the file grows one chunk at a time
+DEFAULT_CHUNK_FRAMES = 1024
+# Per-system recordings made by the viewer, next to its checkpoints
+RECORDING_DIR = os.path.join(cache.DEFAULT_DIR, "recordings")
+
+def frame_dtype(n):
+    """One recorded frame of n bodies: simulated time, positions, velocities."""
+    return np.dtype([("t", "<f8"), ("pos", "<f8", (n, 3)), ("vel", "<f8", (n, 3))])
+
+class TrajectoryWriter:
+    """
+    Streams snapshots of a SimState into a memory-mapped trajectory file.
+    Only the current chunk of chunk_frames frames is mapped, so memory use
+    stays bounded however long the recording runs. The frame count in the
+    preamble is updated on flush(), on close() and whenever a chunk fills;
+    readers only see frames up to the last update, so a crash loses at most
+    one chunk.
+    """
+
+    def __init__(self, path, state, G, time_unit=1.0, length_scale=1.0, chunk_frames=DEFAULT_CHUNK_FRAMES, system=None):
+        self.path = path
+        self.n = len(state)
+        self.dtype = frame_dtype(self.n)
+        self.chunk_frames = chunk_frames
+        header = json.dumps({
+            "system": system,
+            "names": state.names,
+            "colors": state.colors,
+            "masses": state.masses.tolist(),
+            "G": G,
+            "time_unit": time_unit,
+            "length_scale": length_scale,
+            "n_bodies": self.n,
+        }).encode()
+        self.offset = -(-(_PREAMBLE.size + len(header)) // HEADER_ALIGN) * HEADER_ALIGN
+        self._header = header
+        self.frames = 0
+        self._chunk = None
+        self._chunk_start = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, len(header), 0, 0))
+            f.write(header)
+            f.write(b"\0" * (self.offset - _PREAMBLE.size - len(header)))
+
+    def _map_chunk(self, start):
+        if self._chunk is not None:
+            self._chunk.flush()
+            del self._chunk
+        size = self.offset + (start + self.chunk_frames) * self.dtype.itemsize
+        with open(self.path, "r+b") as f:
+            f.truncate(size)
+        self._chunk = np.memmap(self.path, dtype=self.dtype, mode="r+",
+                                offset=self.offset + start * self.dtype.itemsize, shape=(self.chunk_frames,))
+        self._chunk_start = start
+
+    def append(self, t, pos, vel):
+        """Writes one frame."""
+        i = self.frames - self._chunk_start
+        if self._chunk is None or i >= self.chunk_frames:
+            if self._chunk is not None:
+                self.flush()
+            self._map_chunk(self.frames)
+            i = 0
+        chunk = self._chunk
+        chunk["t"][i] = t
+        chunk["pos"][i] = pos
+        chunk["vel"][i] = vel
+        self.frames += 1
+
+    def append_state(self, t, state):
+        self.append(t, state.pos, state.vel)
+
+    def flush(self):
+        """Makes every frame written so far visible to readers."""
+        if self._chunk is not None:
+            self._chunk.flush()
+        with open(self.path, "r+b") as f:
+            f.write(_PREAMBLE.pack(MAGIC, len(self._header), 0, self.frames))
+
+    def close(self):
+        self.flush()
+        if self._chunk is not None:
+            del self._chunk
+            self._chunk = None
+        # Drop the unused tail of the last chunk
+        with open(self.path, "r+b") as f:
+            f.truncate(self.offset + self.frames * self.dtype.itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TrajectoryReader:
+    """
+    Random access to a recorded trajectory through a read-only memmap;
+    nothing is loaded until touched. frames["pos"][i] is the (N, 3)
+    position array of frame i; index_at(t) finds a frame by time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, header_len, _, _ = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"Not a trajectory file: {path}")
+            self.header = json.loads(f.read(header_len))
+        self.offset = -(-(_PREAMBLE.size + header_len) // HEADER_ALIGN) * HEADER_ALIGN
+        self.dtype = frame_dtype(self.header["n_bodies"])
+        self.names = self.header["names"]
+        self.colors = [tuple(c) for c in self.header["colors"]]
+        self.masses = np.array(self.header["masses"])
+        self.G = self.header["G"]
+        self.refresh()
+
+    def refresh(self):
+        """Re-reads the frame count, picking up frames flushed by a live writer."""
+        with open(self.path, "rb") as f:
+            count = _PREAMBLE.unpack(f.read(_PREAMBLE.size))[3]
+        self.frames = (np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.offset, shape=(count,))
+                       if count else np.zeros(0, dtype=self.dtype))
+        return self
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def times(self):
+        return self.frames["t"]
+
+    def index_at(self, t):
+        """Index of the last frame at or before time t (times are increasing)."""
+        return int(np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, max(0, len(self) - 1)))
+
+    def frame(self, i):
+        """(t, pos, vel) of frame i, as views into the file."""
+        f = self.frames[i]
+        return float(f["t"]), f["pos"], f["vel"]
+
+    def state(self, i):
+        """Detached SimState of frame i, e.g. to resume integration from it."""
+        _, pos, vel = self.frame(i)
+        return SimState(self.masses.copy(), np.array(pos), np.array(vel), self.names, self.colors)
+
+def default_path(system=None, directory=RECORDING_DIR):
+    name = (system or "trajectory").replace(" ", "_")
+    return os.path.join(directory, f"{name}.grv")
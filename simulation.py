@@ -0,0 +1,231 @@
+import collections
+import threading
+import time
+import numpy as np
+import data
+import physics
+import recorder
+from profiling import profiler
+
+SECONDS_PER_YEAR = 365.25 * 86400
+
+class Simulation:
+    """
+    Headless simulation engine: owns the state, G, dt, the integrator and the
+    simulated clock, with no display or frame-rate cap. Front ends such as
+    the pygame viewer and the command line drive it through step() and run().
+    time_unit: seconds of real time per simulated time unit
+    length_scale: simulator length units per km
+    """
+
+    def __init__(self, state, G, dt=0.01, integrator="rk4", time_unit=1.0, length_scale=1.0,
+                 accel=physics.get_acceleration, system=None):
+        self.state = state
+        self.G = G
+        self.dt = dt
+        self.time_unit = time_unit
+        self.length_scale = length_scale
+        self.accel = accel
+        self.system = system
+        self.t = 0.0
+        self.steps = 0
+        # Force evaluations spent by step() so far
+        self.force_evals = 0
+        # TrajectoryWriter receiving a frame after every step() call
+        self.recorder = None
+        self.set_integrator(integrator)
+
+    @classmethod
+    def from_system(cls, name, **options):
+        """Loads one of data.SYSTEMS into a new simulation."""
+        package = data.get_system_data(name)
+        return cls(package["state"], package["G"], time_unit=package["time_unit"],
+                   length_scale=package["length_scale"], system=name, **options)
+
+    def set_integrator(self, name):
+        """Switches to the named integrator (see physics.integrator_names())."""
+        self.integrator = name
+        self.step_func = physics.get_integrator(name, self.accel)
+
+    @property
+    def years(self):
+        return self.t * self.time_unit / SECONDS_PER_YEAR
+
+    def years_to_time(self, years):
+        """Simulated time units spanning the given number of years."""
+        return years * SECONDS_PER_YEAR / self.time_unit
+
+    def step(self, n_steps=1, sample_every=1):
+        """
+        Advances n_steps steps of dt. Returns the (n_steps // sample_every, N, 3)
+        block of sampled positions from physics.integrate.
+        """
+        adaptive = isinstance(self.step_func, physics.DormandPrince)
+        evals = self.step_func.n_evals if adaptive else 0
+        _, samples = physics.integrate(self.state, self.dt, n_steps, sample_every, self.G, method=self.step_func)
+        self.t += n_steps * self.dt
+        self.steps += n_steps
+        self.force_evals += self.step_func.n_evals - evals if adaptive else n_steps * physics.EVALS_PER_STEP[self.integrator]
+        if self.recorder is not None:
+            self.recorder.append_state(self.t, self.state)
+        return samples
+
+    def start_recording(self, path, **options):
+        """Streams a frame into the trajectory file at path after every step() call."""
+        self.stop_recording()
+        self.recorder = recorder.TrajectoryWriter(path, self.state, self.G, self.time_unit, self.length_scale,
+                                                  system=self.system, **options)
+        self.recorder.append_state(self.t, self.state)
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def run(self, duration, record_every=1, chunk_steps=10000, progress=None):
+        """
+        Advances by duration simulated time units as fast as the CPU allows,
+        recording positions every record_every steps.
+        progress(steps_done, total_steps) is called after each chunk.
+        Returns (times, positions) with positions shaped (n_records, N, 3).
+        """
+        record_every = max(1, int(record_every))
+        total = int(round(duration / self.dt))
+        n_records = total // record_every
+        times = self.t + self.dt * record_every * np.arange(1, n_records + 1)
+        positions = np.empty((n_records, len(self.state), 3))
+
+        # Chunks are whole multiples of record_every so samples line up; a
+        # recorder gets one frame per step() call, so then chunks are records
+        chunk = max(record_every, chunk_steps - chunk_steps % record_every)
+        if self.recorder is not None:
+            chunk = record_every
+        done, filled = 0, 0
+        while done < total:
+            n = min(chunk, total - done)
+            samples = self.step(n, record_every)
+            positions[filled:filled + len(samples)] = samples
+            filled += len(samples)
+            done += n
+            if progress:
+                progress(done, total)
+        return times, positions
+
+class PhysicsWorker:
+    """
+    Runs a Simulation on a background thread at a fixed tick rate so that
+    rendering never waits for physics. Every tick advances steps_per_tick
+    steps and publishes a snapshot of the positions into a double buffer;
+    the renderer reads an interpolation of the two latest snapshots with
+    snapshot(). When a tick takes longer than its slot the simulation slows
+    down instead of the frame rate.
+    Anything that mutates worker.sim from another thread (switching the
+    integrator, adding test particles) must hold worker.lock.
+    """
+
+    def __init__(self, sim, tick_rate=60.0, steps_per_tick=1):
+        self.sim = sim
+        self.tick_interval = 1.0 / tick_rate
+        self.steps_per_tick = steps_per_tick
+        # While paused the thread keeps ticking but does not step
+        self.paused = False
+        self.lock = threading.Lock()
+        self._swap = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._samples = collections.deque()
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        # Two (wall_time, pos, test_pos) slots; _front is the latest
+        now = time.perf_counter()
+        state = self.sim.state
+        self._buffers = [[now, state.pos.copy(), state.test_pos.copy()] for _ in range(2)]
+        self._front = 0
+
+    def _publish(self):
+        """Copies the current state into the back buffer and swaps it to the front."""
+        state = self.sim.state
+        with self._swap:
+            # The back buffer is the renderer's "previous" snapshot, so it is
+            # only overwritten under the swap lock
+            back = self._buffers[1 - self._front]
+            for i, src in ((1, state.pos), (2, state.test_pos)):
+                if back[i].shape == src.shape:
+                    back[i][...] = src
+                else:
+                    back[i] = src.copy()
+            back[0] = time.perf_counter()
+            self._front = 1 - self._front
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            if self.paused:
+                self._stop.wait(self.tick_interval)
+                next_tick = time.perf_counter()
+                continue
+            with self.lock, profiler.phase("physics"):
+                n = self.steps_per_tick
+                evals = self.sim.force_evals
+                samples = self.sim.step(n, max(1, n // 6))
+                self._publish()
+                profiler.count("force_evals", self.sim.force_evals - evals)
+                # Appended under the lock so replace() cannot clear the queue
+                # between the step and the append
+                self._samples.append(samples)
+
+            next_tick += self.tick_interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # Behind schedule: drop the missed ticks rather than catching up
+                next_tick = time.perf_counter()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="physics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def replace(self, sim):
+        """Swaps in a new Simulation, e.g. after loading another system. Hold lock."""
+        self.sim = sim
+        self._samples.clear()
+        with self._swap:
+            self._reset_buffers()
+
+    def snapshot(self, now=None):
+        """
+        (pos, test_pos) interpolated between the two latest published
+        snapshots, trailing the physics by one tick so motion stays smooth
+        between ticks. Falls back to the latest snapshot when the body or
+        test-particle count has just changed.
+        """
+        now = time.perf_counter() if now is None else now
+        with self._swap:
+            t1, pos1, test1 = self._buffers[self._front]
+            t0, pos0, test0 = self._buffers[1 - self._front]
+            alpha = min(1.0, max(0.0, (now - t1) / self.tick_interval))
+            if pos0.shape != pos1.shape:
+                return pos1.copy(), test1.copy()
+            pos = pos0 + (pos1 - pos0) * alpha
+            test_pos = test0 + (test1 - test0) * alpha if test0.shape == test1.shape else test1.copy()
+        return pos, test_pos
+
+    def drain_samples(self):
+        """Position samples of every tick since the last call, as one (S, N, 3) array."""
+        blocks = []
+        while self._samples:
+            blocks.append(self._samples.popleft())
+        n = len(self.sim.state)
+        blocks = [b for b in blocks if b.shape[1:] == (n, 3)]
+        return np.concatenate(blocks) if blocks else np.empty((0, n, 3))
@@ -0,0 +1,163 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool
+import numpy as np
+import data
+import physics
+
+# One row per run in the result file; final positions are padded to MAX_BODIES
+MAX_BODIES = max(len(config["bodies"]) for config in data.SYSTEMS.values())
+RESULT_DTYPE = np.dtype([
+    ("system", "U32"),
+    ("integrator", "U16"),
+    ("dt", "f8"),
+    ("mass_scale", "f8"),
+    ("repeat", "i4"),
+    ("done", "?"),
+    ("energy_error", "f8"),
+    ("max_energy_error", "f8"),
+    ("force_evals", "i8"),
+    ("wall_seconds", "f8"),
+    ("final_pos", "f8", (MAX_BODIES, 3)),
+])
+
+def build_runs(systems, integrators, dts, mass_scales=(1.0,), repeats=1):
+    """Cartesian product of the sweep axes as a list of run-parameter dicts."""
+    return [
+        {"system": s, "integrator": i, "dt": dt, "mass_scale": m, "repeat": r}
+        for s, i, dt, m, r in itertools.product(systems, integrators, dts, mass_scales, range(repeats))
+    ]
+
+# Per-worker globals, set once by the pool initializer instead of pickling
+# the base systems with every run
+_worker = {}
+
+def _init_worker(out_path, systems, runs, span, perturbation, seeds):
+    _worker.update(
+        results=np.load(out_path, mmap_mode="r+"),
+        systems=systems, runs=runs, span=span, perturbation=perturbation, seeds=seeds,
+    )
+
+def run_one(base, G, params, span, perturbation, seed):
+    """
+    Integrates one configuration for span simulated time units. Non-primary
+    masses are scaled by mass_scale; with perturbation > 0 positions get
+    relative Gaussian noise drawn from seed, so repeats differ but every run
+    is reproducible regardless of which worker executes it.
+    """
+    masses, pos, vel = (np.array(a) for a in base)
+    primary = np.argmax(masses)
+    masses[np.arange(len(masses)) != primary] *= params["mass_scale"]
+    if perturbation > 0:
+        rng = np.random.default_rng(seed)
+        pos += rng.normal(0.0, perturbation, pos.shape) * np.linalg.norm(pos, axis=1)[:, np.newaxis]
+
+    state = physics.SimState(masses, pos, vel)
+    accel = physics.counting(physics.get_acceleration)
+    step = physics.get_integrator(params["integrator"], accel)
+    e0 = physics.total_energy(state, G)
+    max_err = 0.0
+    # Only the steps are timed; the O(N^2) energy check stays outside, as in
+    # integrator_report, so wall_seconds compares integrators fairly
+    elapsed = 0.0
+    for _ in range(int(round(span / params["dt"]))):
+        t0 = time.perf_counter()
+        step(state, params["dt"], G)
+        elapsed += time.perf_counter() - t0
+        max_err = max(max_err, abs(physics.total_energy(state, G) / e0 - 1))
+    return {
+        "energy_error": abs(physics.total_energy(state, G) / e0 - 1),
+        "max_energy_error": max_err,
+        "force_evals": accel.calls,
+        "wall_seconds": elapsed,
+        "final_pos": state.pos,
+    }
+
+def _run_index(index):
+    w = _worker
+    params = w["runs"][index]
+    base, G = w["systems"][params["system"]]
+    result = run_one(base, G, params, w["span"], w["perturbation"], w["seeds"][index])
+
+    row = w["results"][index]
+    for key in ("energy_error", "max_energy_error", "force_evals", "wall_seconds"):
+        row[key] = result[key]
+    row["final_pos"][:len(result["final_pos"])] = result["final_pos"]
+    row["done"] = True
+    return index
+
+def run_sweep(runs, out_path, span=10.0, perturbation=0.0, seed=0, processes=None, progress=None):
+    """
+    Runs every configuration on a process pool and writes one RESULT_DTYPE
+    row per run into a memory-mapped .npy file at out_path; workers write
+    their rows in place, so only run indices cross process boundaries.
+    progress(done, total) is called after each finished run.
+    Returns the result array, opened read-only from out_path.
+    """
+    processes = processes or os.cpu_count() or 1
+    results = np.lib.format.open_memmap(out_path, mode="w+", dtype=RESULT_DTYPE, shape=(len(runs),))
+    for i, params in enumerate(runs):
+        for key, value in params.items():
+            results[i][key] = value
+    results.flush()
+    del results
+
+    # Base systems are fetched once in the parent and shipped to each worker once
+    systems = {}
+    for name in sorted({r["system"] for r in runs}):
+        package = data.get_system_data(name)
+        state = package["state"]
+        systems[name] = ((state.masses, state.pos, state.vel), package["G"])
+    seeds = np.random.SeedSequence(seed).generate_state(len(runs))
+
+    # Round-robin chunks keep long and short configurations mixed per worker
+    chunksize = max(1, len(runs) // (processes * 8))
+    with Pool(processes, _init_worker, (out_path, systems, runs, span, perturbation, seeds)) as pool:
+        for done, _ in enumerate(pool.imap_unordered(_run_index, range(len(runs)), chunksize), 1):
+            if progress:
+                progress(done, len(runs))
+
+    return np.load(out_path, mmap_mode="r")
+
+def _print_progress(start):
+    def progress(done, total):
+        elapsed = time.perf_counter() - start
+        eta = elapsed / done * (total - done)
+        sys.stdout.write(f"\r[{done}/{total}] {elapsed:.1f}s elapsed, ~{eta:.1f}s left")
+        if done == total:
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+    return progress
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep over systems, integrators, dt and masses.")
+    parser.add_argument("--systems", nargs="+", default=["TRAPPIST-1"])
+    parser.add_argument("--integrators", nargs="+", default=["rk4", "leapfrog"])
+    parser.add_argument("--dt", nargs="+", type=float, default=[0.01])
+    parser.add_argument("--mass-scales", nargs="+", type=float, default=[1.0])
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--span", type=float, default=10.0, help="simulated time per run")
+    parser.add_argument("--perturbation", type=float, default=0.0, help="relative position noise per repeat")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--out", default="sweep.npy")
+    args = parser.parse_args(argv)
+
+    runs = build_runs(args.systems, args.integrators, args.dt, args.mass_scales, args.repeats)
+    print(f"{len(runs)} runs on {args.processes or os.cpu_count()} processes -> {args.out}")
+    try:
+        results = run_sweep(runs, args.out, args.span, args.perturbation, args.seed, args.processes,
+                            _print_progress(time.perf_counter()))
+    except data.OfflineError as e:
+        print(f"sweep: {e}", file=sys.stderr)
+        return 1
+    for name in np.unique(results["integrator"]):
+        rows = results[results["integrator"] == name]
+        print(f"{name:>14}: median |dE/E| {np.median(rows['energy_error']):.3e}, "
+              f"median {np.median(rows['wall_seconds']):.3f} s per run")
+
+if __name__ == "__main__":
+    sys.exit(main())
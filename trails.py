@@ -0,0 +1,112 @@
+import numpy as np
+
+# Samples kept per body by default
+DEFAULT_CAPACITY = 350
+
+class TrailBuffer:
+    """
+    Trail history of N bodies in one preallocated (N, 2 * capacity, 3) array.
+    Every stored sample is written twice, at slot head and head + capacity,
+    so the latest capacity samples of every body are always one contiguous
+    slice: view() and indexing return ordered (oldest first) views without
+    copying, and appending is O(1) per sample with no array allocation.
+    decimation: only every decimation-th pushed sample is stored
+    lengths: (N,) number of valid samples per body, so single trails can
+    be cleared or replaced while all bodies share one write head
+    """
+
+    def __init__(self, n, capacity=DEFAULT_CAPACITY, decimation=1):
+        self.capacity = int(capacity)
+        self.decimation = max(1, int(decimation))
+        self._data = np.zeros((n, 2 * self.capacity, 3))
+        self.lengths = np.zeros(n, dtype=np.int64)
+        self.head = 0
+        self._phase = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def view(self):
+        """(N, capacity, 3) ordered view; only the last lengths[i] rows of body i are valid."""
+        return self._data[:, self.head:self.head + self.capacity]
+
+    def __getitem__(self, i):
+        """Ordered (lengths[i], 3) view of body i's trail."""
+        return self._data[i, self.head + self.capacity - self.lengths[i]:self.head + self.capacity]
+
+    def __setitem__(self, i, points):
+        """Replaces body i's trail with up to capacity (x, y, z) points."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)[-self.capacity:]
+        k = len(points)
+        if k:
+            slots = (self.head - k + np.arange(k)) % self.capacity
+            self._data[i, slots] = points
+            self._data[i, slots + self.capacity] = points
+        self.lengths[i] = k
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def push(self, pos):
+        """Appends one (N, 3) sample of every body."""
+        self.extend(np.asarray(pos)[np.newaxis])
+
+    def extend(self, samples):
+        """Appends an (S, N, 3) block of samples, keeping every decimation-th one."""
+        samples = np.asarray(samples, dtype=np.float64)
+        if self.decimation > 1:
+            # Strided view starting at the first sample due to be kept
+            first = -self._phase % self.decimation
+            self._phase = (self._phase + len(samples)) % self.decimation
+            samples = samples[first::self.decimation]
+        samples = samples[-self.capacity:]
+        k = len(samples)
+        if k == 0:
+            return
+        # At most two runs of slots, split where the ring wraps; each is
+        # written through slices, at head and at head + capacity
+        block = samples.transpose(1, 0, 2)
+        cap, head = self.capacity, self.head
+        first = min(k, cap - head)
+        for start, lo, hi in ((head, 0, first), (0, first, k)):
+            if hi > lo:
+                self._data[:, start:start + hi - lo] = block[:, lo:hi]
+                self._data[:, start + cap:start + cap + hi - lo] = block[:, lo:hi]
+        self.head = (head + k) % cap
+        np.add(self.lengths, k, out=self.lengths)
+        np.minimum(self.lengths, cap, out=self.lengths)
+
+    def clear(self):
+        self.lengths[:] = 0
+        self._phase = 0
+
+    def copy(self):
+        trails = TrailBuffer(len(self), self.capacity, self.decimation)
+        trails._data[...] = self._data
+        trails.lengths[:] = self.lengths
+        trails.head, trails._phase = self.head, self._phase
+        return trails
+
+    def get_state(self):
+        """
+        (arrays, meta) that describe the buffer exactly, e.g. for checkpoints:
+        arrays holds "data" and "lengths" (not copied), meta the JSON-safe
+        capacity, decimation, head and phase.
+        """
+        arrays = {"data": self._data, "lengths": self.lengths}
+        meta = {"capacity": self.capacity, "decimation": self.decimation,
+                "head": self.head, "phase": self._phase}
+        return arrays, meta
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        """Rebuilds a buffer from get_state() output, adopting the arrays without copying."""
+        trails = cls(0, meta["capacity"], meta["decimation"])
+        data, lengths = arrays["data"], arrays["lengths"]
+        if data.shape != (len(lengths), 2 * trails.capacity, 3):
+            raise ValueError(f"Trail data of shape {data.shape} does not match {len(lengths)} trails "
+                             f"of capacity {trails.capacity}")
+        trails._data, trails.lengths = data, lengths
+        trails.head, trails._phase = int(meta["head"]), int(meta["phase"])
+        return trails
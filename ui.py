@@ -1,3 +1,4 @@
+import functools
 import pygame
 import numpy as np
 from visualization import WHITE, BLACK, GOLD, SCREEN_WIDTH, SCREEN_HEIGHT
@@ -26,6 +27,18 @@ def init_fonts():
         _title_font = pygame.font.SysFont("Arial", 20, bold=True)
         _small_font = pygame.font.SysFont("Arial", 12, bold=True)
 
+# Rendered text surfaces kept by render_text (labels, button captions)
+TEXT_CACHE_SIZE = 512
+
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(font, text, color):
+    """Antialiased text surface, cached by (font, text, color); do not draw on the result."""
+    return font.render(text, True, color)
+
+def render_label(text, color=(210, 210, 210)):
+    """Body label in the default font."""
+    return render_text(_font, text, color)
+
 class Button:
     def __init__(self, x, y, w, h, text, color=(40, 44, 52), hover_color=(56, 62, 73)):
         self.rect = pygame.Rect(x, y, w, h)
@@ -36,26 +49,32 @@ class Button:
         self.is_hovered = False
         self.alpha = 180
         self.anim_speed = 0.15
+        # Background surface and the (color, hovered) state it was drawn for
+        self._surf = None
+        self._surf_key = None
 
     def draw(self, surface):
         # Interpolate color for smooth hover effect
         target = self.hover_color if self.is_hovered else self.base_color
         self.current_color += (target - self.current_color) * self.anim_speed
         
-        # Draw glassmorphism background
-        btn_surf = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-        color_with_alpha = list(self.current_color.astype(int)) + [self.alpha]
-        pygame.draw.rect(btn_surf, color_with_alpha, btn_surf.get_rect(), border_radius=8)
+        # Draw glassmorphism background, only when the animation has moved it
+        key = (tuple(self.current_color.astype(int).tolist()), self.is_hovered)
+        if key != self._surf_key:
+            btn_surf = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
+            color_with_alpha = list(key[0]) + [self.alpha]
+            pygame.draw.rect(btn_surf, color_with_alpha, btn_surf.get_rect(), border_radius=8)
         
-        # Border glow
-        border_color = (120, 150, 200, 100) if self.is_hovered else (80, 80, 80, 60)
-        pygame.draw.rect(btn_surf, border_color, btn_surf.get_rect(), 2, border_radius=8)
+            # Border glow
+            border_color = (120, 150, 200, 100) if self.is_hovered else (80, 80, 80, 60)
+            pygame.draw.rect(btn_surf, border_color, btn_surf.get_rect(), 2, border_radius=8)
+            self._surf, self._surf_key = btn_surf, key
         
-        surface.blit(btn_surf, self.rect.topleft)
+        surface.blit(self._surf, self.rect.topleft)
         
         # Text
         txt_color = WHITE if not self.is_hovered else GOLD
-        txt_surf = _font.render(self.text, True, txt_color)
+        txt_surf = render_text(_font, self.text, txt_color)
         txt_rect = txt_surf.get_rect(center=self.rect.center)
         surface.blit(txt_surf, txt_rect)
 
@@ -74,6 +93,8 @@ class Slider:
         self.update_handle()
         self.dragging = False
         self.is_hovered = False
+        self._track = None
+        self._track_width = None
 
     def update_handle(self):
         pos = self.rect.x + (self.val - self.min_val) / (self.max_val - self.min_val) * (self.rect.width - 14)
@@ -81,22 +102,24 @@ class Slider:
 
     def draw(self, surface):
         # Draw Label
-        label_txt = _small_font.render(self.label.upper(), True, (150, 150, 150))
-        val_txt = _font.render(f"{int(self.val)}x", True, WHITE)
+        label_txt = render_text(_small_font, self.label.upper(), (150, 150, 150))
+        val_txt = render_text(_font, f"{int(self.val)}x", WHITE)
         surface.blit(label_txt, (self.rect.x, self.rect.y - 25))
         surface.blit(val_txt, (self.rect.right - val_txt.get_width(), self.rect.y - 28))
         
-        # Draw Track
-        track_surf = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-        pygame.draw.rect(track_surf, (50, 50, 50, 150), track_surf.get_rect(), border_radius=4)
-        
-        # Draw Progress
+        # Draw Track, re-rendered only when the progress width changes
         progress_w = int((self.val - self.min_val) / (self.max_val - self.min_val) * self.rect.width)
-        if progress_w > 0:
-            progress_rect = pygame.Rect(0, 0, progress_w, self.rect.height)
-            pygame.draw.rect(track_surf, (80, 120, 255, 180), progress_rect, border_radius=4)
+        if progress_w != self._track_width:
+            track_surf = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
+            pygame.draw.rect(track_surf, (50, 50, 50, 150), track_surf.get_rect(), border_radius=4)
+        
+            # Draw Progress
+            if progress_w > 0:
+                progress_rect = pygame.Rect(0, 0, progress_w, self.rect.height)
+                pygame.draw.rect(track_surf, (80, 120, 255, 180), progress_rect, border_radius=4)
+            self._track, self._track_width = track_surf, progress_w
         
-        surface.blit(track_surf, self.rect.topleft)
+        surface.blit(self._track, self.rect.topleft)
         
         # Draw Handle
         handle_color = (255, 255, 255) if self.dragging or self.is_hovered else (200, 200, 200)
@@ -133,19 +156,25 @@ class SystemSelector:
         
         self.speed_slider = Slider(25, 60 + len(self.systems) * 38 + 50, 170, 8, 1, 200, "Simulation Speed")
         self.current_system = "Solar System"
+        self.integrator = "rk4"
+        # Optional status line under the integrator, e.g. the playback date
+        self.status = None
         self.loading = False
         self.rect = pygame.Rect(10, 10, 200, 60 + len(self.systems) * 38 + 100)
+        self._panel = None
+        self._overlay = None
 
     def draw(self, surface):
-        # Draw Panel Background (Glassmorphism)
-        panel_surf = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-        pygame.draw.rect(panel_surf, (20, 24, 30, 200), panel_surf.get_rect(), border_radius=15)
-        # Border
-        pygame.draw.rect(panel_surf, (100, 100, 100, 80), panel_surf.get_rect(), 2, border_radius=15)
-        surface.blit(panel_surf, self.rect.topleft)
+        # Draw Panel Background (Glassmorphism), rendered once
+        if self._panel is None:
+            self._panel = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
+            pygame.draw.rect(self._panel, (20, 24, 30, 200), self._panel.get_rect(), border_radius=15)
+            # Border
+            pygame.draw.rect(self._panel, (100, 100, 100, 80), self._panel.get_rect(), 2, border_radius=15)
+        surface.blit(self._panel, self.rect.topleft)
 
         # Draw Title
-        title_surf = _title_font.render("SIMULATION CONTROL", True, GOLD)
+        title_surf = render_text(_title_font, "SIMULATION CONTROL", GOLD)
         surface.blit(title_surf, (self.rect.x + 15, self.rect.y + 20))
         pygame.draw.line(surface, (80, 80, 80), (self.rect.x + 15, self.rect.y + 45), (self.rect.right - 15, self.rect.y + 45), 1)
 
@@ -154,11 +183,18 @@ class SystemSelector:
             
         self.speed_slider.draw(surface)
 
+        integrator_txt = render_text(_small_font, f"INTEGRATOR: {self.integrator.upper()}  [I]", (150, 150, 150))
+        surface.blit(integrator_txt, (self.speed_slider.rect.x, self.speed_slider.rect.bottom + 16))
+        if self.status:
+            status_txt = _small_font.render(self.status, True, GOLD)
+            surface.blit(status_txt, (self.speed_slider.rect.x, self.speed_slider.rect.bottom + 34))
+
         if self.loading:
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 150))
-            surface.blit(overlay, (0, 0))
-            loading_txt = _title_font.render("ESTABLISHING LINK...", True, GOLD)
+            if self._overlay is None:
+                self._overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+                self._overlay.fill((0, 0, 0, 150))
+            surface.blit(self._overlay, (0, 0))
+            loading_txt = render_text(_title_font, "ESTABLISHING LINK...", GOLD)
             txt_rect = loading_txt.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
             surface.blit(loading_txt, txt_rect)
 
@@ -175,3 +211,46 @@ class SystemSelector:
                     if btn.text != self.current_system:
                         return btn.text
         return None
+
+# Frames between refreshes of the profiler HUD's text
+HUD_REFRESH = 15
+
+class ProfilerHUD:
+    """
+    Overlay of a profiling.Profiler: p50/p95/p99 ms of every phase over the
+    rolling window and the mean of each counter per frame. The panel is
+    re-rendered every HUD_REFRESH frames and blitted in between.
+    """
+
+    def __init__(self, x=SCREEN_WIDTH - 290, y=10, width=280):
+        self.x, self.y, self.width = x, y, width
+        self._panel = None
+        self._age = HUD_REFRESH
+
+    def draw(self, surface, profiler):
+        self._age += 1
+        if self._panel is None or self._age >= HUD_REFRESH:
+            self._panel = self._render(profiler)
+            self._age = 0
+        surface.blit(self._panel, (self.x, self.y))
+
+    def _render(self, profiler):
+        phases, counters = profiler.summary()
+        # Rows of (cells, color); the first cell is left-aligned, the rest
+        # are right-aligned on the value columns
+        rows = [(["PHASE (MS)", "P50", "P95", "P99"], GOLD)]
+        rows += [([name] + [f"{v:.2f}" for v in values], WHITE) for name, values in phases]
+        rows += [([f"{name} / frame", "", "", f"{value:.0f}"], (150, 150, 150)) for name, value in sorted(counters.items())]
+        rows.append((["[H] HUD   [T] TRACE" + ("  RECORDING" if profiler.tracing else "")], (150, 150, 150)))
+
+        line_h = _small_font.get_linesize()
+        columns = (self.width - 132, self.width - 72, self.width - 12)
+        panel = pygame.Surface((self.width, 20 + line_h * len(rows)), pygame.SRCALPHA)
+        pygame.draw.rect(panel, (20, 24, 30, 200), panel.get_rect(), border_radius=10)
+        for i, (cells, color) in enumerate(rows):
+            y = 10 + i * line_h
+            panel.blit(_small_font.render(cells[0], True, color), (12, y))
+            for right, text in zip(columns, cells[1:]):
+                txt = _small_font.render(text, True, color)
+                panel.blit(txt, (right - txt.get_width(), y))
+        return panel
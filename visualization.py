@@ -13,7 +13,18 @@ SPACE_BLUE = (10, 12, 20)
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 800
 
+# Number of parallax layers the starfield is pre-rendered into
+STAR_LAYERS = 4
+
 class Starfield:
+    """
+    Parallax starfield. Stars are grouped into STAR_LAYERS depth layers that
+    scroll with wrap-around; each star is pre-rendered once into a tiny
+    sprite, so composing the background is a fill and one blits() call of
+    a few hundred small sprites. The composed background is reused as long
+    as the camera-dependent offsets do not change.
+    """
+
     def __init__(self, count=200):
         self.stars = []
         for _ in range(count):
@@ -24,20 +35,46 @@ class Starfield:
                 random.uniform(0.5, 1.8),
                 random.uniform(0.1, 0.5)
             ])
+        self._build_layers()
+        self._background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self._offsets = None
+
+    def _build_layers(self):
+        # Each layer scrolls with the mean parallax factor of its stars and
+        # keeps (sprites, sprite x, sprite y) of those stars
+        self.layers = []
+        edges = np.linspace(0.1, 0.5, STAR_LAYERS + 1)
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            stars = [s for s in self.stars if lo <= s[3] < hi or (hi == edges[-1] and s[3] == hi)]
+            if not stars: continue
+            sprites, xs, ys = [], [], []
+            for x, y, size, layer in stars:
+                brightness = int(255 * (layer / 0.5))
+                r = int(size)
+                sprite = pygame.Surface((2 * r + 1, 2 * r + 1))
+                sprite.set_colorkey(BLACK)
+                pygame.draw.circle(sprite, (brightness, brightness, brightness), (r, r), r)
+                bounds = sprite.get_bounding_rect()
+                if not bounds.width: continue
+                sprites.append(sprite.subsurface(bounds))
+                xs.append(int(x) - r + bounds.x)
+                ys.append(int(y) - r + bounds.y)
+            self.layers.append((float(np.mean([s[3] for s in stars])), (sprites, np.array(xs), np.array(ys))))
 
     def draw(self, surface, cam_theta, cam_phi):
-        surface.fill(SPACE_BLUE)
-        for star in self.stars:
-            # Simple parallax effect based on camera rotation
-            offsetX = (cam_theta * 100 * star[3]) % SCREEN_WIDTH
-            offsetY = (cam_phi * 100 * star[3]) % SCREEN_HEIGHT
-            
-            x = (star[0] + offsetX) % SCREEN_WIDTH
-            y = (star[1] + offsetY) % SCREEN_HEIGHT
-            
-            brightness = int(255 * (star[3] / 0.5))
-            color = (brightness, brightness, brightness)
-            pygame.draw.circle(surface, color, (int(x), int(y)), int(star[2]))
+        # Simple parallax effect based on camera rotation
+        offsets = tuple(
+            (int((cam_theta * 100 * factor) % SCREEN_WIDTH), int((cam_phi * 100 * factor) % SCREEN_HEIGHT))
+            for factor, _ in self.layers
+        )
+        if offsets != self._offsets:
+            self._background.fill(SPACE_BLUE)
+            blits = []
+            for (ox, oy), (_, (sprites, xs, ys)) in zip(offsets, self.layers):
+                blits.extend(zip(sprites, zip(((xs + ox) % SCREEN_WIDTH).tolist(), ((ys + oy) % SCREEN_HEIGHT).tolist())))
+            self._background.blits(blits, doreturn=False)
+            self._offsets = offsets
+        surface.blit(self._background, (0, 0))
 
 def draw_tapered_trail(surface, proj_trail, color):
     """Draws a trail that tapers in thickness and fades in alpha."""
@@ -54,46 +91,218 @@ def draw_tapered_trail(surface, proj_trail, color):
         
         pygame.draw.line(surface, list(color) + [alpha], (x0, y0), (x1, y1), width)
 
-def get_projection_func(cam_r, cam_phi, cam_theta):
-    """Returns a projection function for the current camera state."""
-    
-    def project_3d(x, y, z):
-        # Camera position (spherical → cartesian)
-        cx = cam_r * cos(cam_phi) * cos(cam_theta)
-        cy = cam_r * sin(cam_phi)
-        cz = cam_r * cos(cam_phi) * sin(cam_theta)
+# Alpha/width bands tapered trails are quantized into; a multiple of 3 so
+# the band edges fall on the width steps of draw_tapered_trail
+TRAIL_BANDS = 12
 
-        # Translate point into camera space
-        px = x - cx
-        py = y - cy
-        pz = z - cz
+class TrailRenderer:
+    """
+    Draws every tapered, fading trail with one pygame.draw.lines call per
+    alpha band instead of one draw.line per segment. Trails are drawn on a
+    persistent SRCALPHA surface of which only the region touched in the
+    previous frame is cleared and blitted. draw_calls holds the number of
+    pygame draw and blit calls issued by the last draw().
+    """
 
-        # Camera basis (look-at origin)
-        forward = np.array([-cx, -cy, -cz])
-        norm = np.linalg.norm(forward)
-        if norm == 0: forward = np.array([0, 0, -1])
-        else: forward /= norm
+    def __init__(self, size=(SCREEN_WIDTH, SCREEN_HEIGHT), bands=TRAIL_BANDS):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.bands = bands
+        self.draw_calls = 0
+        self._dirty = None
+        # Per band: (first progress, alpha, width), matching draw_tapered_trail
+        centers = (np.arange(bands) + 0.5) / bands
+        self._alphas = (100 * centers ** 1.5).astype(int).tolist()
+        self._widths = np.maximum(1, (3 * np.arange(bands) / bands).astype(int)).tolist()
 
-        right = np.cross([0, 1, 0], forward)
-        norm_r = np.linalg.norm(right)
-        if norm_r == 0: right = np.array([1, 0, 0])
-        else: right /= norm_r
+    def draw(self, target, trails, colors):
+        """
+        trails: one sequence of (x, y) screen points per trail, oldest first
+        colors: RGB color of each trail
+        """
+        if self._dirty is not None:
+            self.surface.fill((0, 0, 0, 0), self._dirty)
+        dirty = None
+        calls = 0
+
+        bands = self.bands
+        for points, color in zip(trails, colors):
+            n = len(points)
+            if n < 2: continue
+            points = points.tolist() if isinstance(points, np.ndarray) else list(points)
+            # Segment i (points i -> i + 1) has progress i / n; band b starts at ceil(b * n / bands)
+            edges = [-(-b * n // bands) for b in range(bands)] + [n - 1]
+            for b in range(bands):
+                start, end = edges[b], min(edges[b + 1], n - 1)
+                if end <= start: continue
+                rect = pygame.draw.lines(self.surface, (*color, self._alphas[b]), False,
+                                         points[start:end + 1], self._widths[b])
+                dirty = rect if dirty is None else dirty.union(rect)
+                calls += 1
+
+        if dirty is not None:
+            dirty = dirty.clip(self.surface.get_rect())
+            target.blit(self.surface, dirty.topleft, dirty)
+            calls += 1
+        self._dirty = dirty
+        self.draw_calls = calls
+
+# ---------- Bodies ----------
+# Bodies at most this many pixels in radius are splatted as single pixels...
+SPLAT_RADIUS = 1
+# ...unless they are among the FULL_DETAIL_MAX largest on screen, which always
+# get circles, highlights and labels
+FULL_DETAIL_MAX = 64
+# Bodies further than this are not labelled
+LABEL_DEPTH = 5500
+
+def splat_points(surface, xy, colors, depth=None, additive=False):
+    """
+    Writes single-pixel points straight into surface through surfarray.
+    xy: (M, 2) integer screen coordinates; points off the surface are ignored
+    colors: one RGB color or an (M, 3) array
+    depth: optional (M,) depths; far points are written first so nearer win
+    additive: sum the colors of points sharing a pixel onto the background,
+              saturating at 255, instead of overwriting
+    """
+    xy = np.asarray(xy)
+    w, h = surface.get_size()
+    inside = (xy[:, 0] >= 0) & (xy[:, 0] < w) & (xy[:, 1] >= 0) & (xy[:, 1] < h)
+    colors = np.broadcast_to(np.asarray(colors, dtype=np.uint8), (len(xy), 3))[inside]
+    x, y = xy[inside, 0], xy[inside, 1]
+    if not len(x):
+        return
+
+    pixels = pygame.surfarray.pixels3d(surface)
+    try:
+        if additive:
+            pixel, inverse = np.unique(x * h + y, return_inverse=True)
+            sums = np.stack([np.bincount(inverse, colors[:, c], len(pixel)) for c in range(3)], axis=1)
+            px, py = np.divmod(pixel, h)
+            pixels[px, py] = np.minimum(pixels[px, py] + sums, 255).astype(np.uint8)
+        else:
+            if depth is not None:
+                order = np.argsort(-np.asarray(depth)[inside], kind="stable")
+                x, y, colors = x[order], y[order], colors[order]
+            # With repeated pixels the last (nearest) write wins
+            pixels[x, y] = colors
+    finally:
+        del pixels
 
+def draw_bodies(surface, xy, depth, visible, radii, colors, names, render_label=None, additive=False):
+    """
+    Level-of-detail body pass. The FULL_DETAIL_MAX largest visible bodies and
+    every body larger than SPLAT_RADIUS among them are drawn as shaded circles,
+    far to near; all other visible bodies are splatted in bulk with
+    splat_points. Labels from render_label(name) are drawn for detailed
+    bodies nearer than LABEL_DEPTH, nearest first, skipping any label that
+    would overlap one already placed. Returns the number of draw and blit
+    calls issued, counting the bulk splat as one.
+    """
+    index = np.flatnonzero(visible)
+    if not len(index):
+        return 0
+    colors = np.asarray(colors, dtype=np.uint8)
+    r = radii[index]
+    if len(index) > FULL_DETAIL_MAX:
+        largest = np.argpartition(-r, FULL_DETAIL_MAX - 1)[:FULL_DETAIL_MAX]
+        detailed = np.zeros(len(index), dtype=bool)
+        detailed[largest] = r[largest] > SPLAT_RADIUS
+    else:
+        detailed = np.ones(len(index), dtype=bool)
+
+    small = index[~detailed]
+    if len(small):
+        splat_points(surface, xy[small], colors[small], depth[small], additive)
+    calls = 1 if len(small) else 0
+
+    big = index[detailed]
+    big = big[np.argsort(-depth[big], kind="stable")]
+    for i in big.tolist():
+        sx, sy, rad = int(xy[i, 0]), int(xy[i, 1]), int(radii[i])
+        c = colors[i].tolist()
+        # Core
+        pygame.draw.circle(surface, c, (sx, sy), rad)
+        # Subtle Highlight
+        hl_color = [min(255, channel + 100) for channel in c]
+        pygame.draw.circle(surface, hl_color, (sx - rad // 3, sy - rad // 3), max(1, rad // 4))
+    calls += 2 * len(big)
+
+    if render_label is None:
+        return calls
+    placed = []
+    for i in big[::-1].tolist():
+        if depth[i] >= LABEL_DEPTH:
+            continue
+        label_surf = render_label(names[i])
+        rect = label_surf.get_rect(topleft=(int(xy[i, 0]) + int(radii[i]) + 10, int(xy[i, 1]) - 10))
+        if rect.collidelist(placed) == -1:
+            surface.blit(label_surf, rect)
+            placed.append(rect)
+    return calls + len(placed)
+
+# ---------- Camera ----------
+FOCAL_LENGTH = 600
+# Points closer to the camera than this (in camera depth) are culled
+NEAR_PLANE = 1e-3
+
+class Camera:
+    """
+    Orbiting look-at-origin camera. The view basis is computed once on
+    construction; project() then maps whole point arrays to the screen.
+    """
+
+    def __init__(self, cam_r, cam_phi, cam_theta, focal=FOCAL_LENGTH, near=NEAR_PLANE):
+        # Camera position (spherical → cartesian)
+        self.position = np.array([
+            cam_r * cos(cam_phi) * cos(cam_theta),
+            cam_r * sin(cam_phi),
+            cam_r * cos(cam_phi) * sin(cam_theta),
+        ])
+        self.focal = focal
+        self.near = near
+
+        # Camera basis (look-at origin)
+        norm = np.linalg.norm(self.position)
+        forward = -self.position / norm if norm > 0 else np.array([0.0, 0.0, -1.0])
+        right = np.cross([0.0, 1.0, 0.0], forward)
+        norm_r = np.linalg.norm(right)
+        right = right / norm_r if norm_r > 0 else np.array([1.0, 0.0, 0.0])
         up = np.cross(forward, right)
+        # Rows are the camera axes, so (p - position) @ basis.T is camera space
+        self.basis = np.stack([right, up, forward])
 
-        # Coordinates in camera space
-        x_cam = np.dot([px, py, pz], right)
-        y_cam = np.dot([px, py, pz], up)
-        z_cam = np.dot([px, py, pz], forward)
+    def project(self, points, margin=0):
+        """
+        Projects a (..., 3) array of points in one matrix multiply.
+        Returns (screen, depth, visible): integer (..., 2) screen coordinates,
+        (...,) camera-space depth and a (...,) mask of points in front of the
+        near plane and within margin pixels of the screen. margin may be a
+        scalar or an array broadcastable to the point shape.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        cam = (points - self.position) @ self.basis.T
+        depth = cam[..., 2]
+        in_front = depth > self.near
+        scale = self.focal / np.where(in_front, depth, 1.0)
 
-        if z_cam <= 0:
-            return None  # behind camera
+        sx = SCREEN_WIDTH / 2 + cam[..., 0] * scale
+        sy = SCREEN_HEIGHT / 2 - cam[..., 1] * scale
+        visible = (in_front
+                   & (sx >= -margin) & (sx < SCREEN_WIDTH + margin)
+                   & (sy >= -margin) & (sy < SCREEN_HEIGHT + margin))
 
-        # Perspective projection
-        f = 600 # Slightly increased FOV effect
-        sx = int(SCREEN_WIDTH / 2 + f * x_cam / z_cam)
-        sy = int(SCREEN_HEIGHT / 2 - f * y_cam / z_cam)
+        # Clip before the integer cast so far off-screen points cannot overflow
+        limit = 1e6
+        screen = np.stack([np.clip(sx, -limit, limit), np.clip(sy, -limit, limit)], axis=-1).astype(np.int64)
+        return screen, depth, visible
 
-        return sx, sy, z_cam
-        
-    return project_3d
+    def project_point(self, x, y, z):
+        """Single-point projection: (sx, sy, depth), or None behind the camera."""
+        (sx, sy), depth, _ = self.project((x, y, z))
+        if depth <= self.near:
+            return None
+        return int(sx), int(sy), float(depth)
+
+def get_projection_func(cam_r, cam_phi, cam_theta):
+    """Returns a projection function for the current camera state."""
+    return Camera(cam_r, cam_phi, cam_theta).project_point